@@ -0,0 +1,111 @@
+'''
+Benchmark of the Block.from_signed_raw parser, with all the sections
+decoded or only the header, against the parser of a git revision.
+
+Usage : python bench/bench_block_parser.py [NB_TRANSACTIONS] [NB_ROUNDS] [BASELINE_REV]
+
+The lib directory of BASELINE_REV is exported with git archive in a
+temporary directory. Each parser is measured in its own process.
+'''
+import sys
+import os
+import io
+import shutil
+import subprocess
+import tarfile
+import tempfile
+import timeit
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+PUBKEY_FROM = "HsLShAtzXTVxeUtQd7yi5Z5Zh4zNvbu8sTEZ53nfKcqY"
+PUBKEY_TO = "8Fi1VSTbjkXguwThF4v2ZxC5whK7pwG2vcGTkPUPjPGU"
+SIGNATURE = "42yQm4hGTJYWkPg39hQAUgP6S6EQ4vTfXdJuxKEHL1ih6YHiDL2hcwrFgBHjXLRgxRhj2VNVqqc6b4JayKqTE14r"
+HASH = "DA39A3EE5E6B4B0D3255BFEF95601890AFD80709"
+
+
+def sample_block(nb_transactions):
+    '''
+    Generate the signed raw of a block with identities,
+    memberships, certifications and transactions.
+    '''
+    lines = ["Version: 1", "Type: Block", "Currency: meta_brouzouf",
+             "Nonce: 45079", "Number: 15", "PoWMin: 4", "Time: 1418083330",
+             "MedianTime: 1418080208", "UniversalDividend: 100",
+             "Issuer: " + PUBKEY_FROM, "PreviousHash: " + HASH,
+             "PreviousIssuer: " + PUBKEY_TO, "MembersCount: 4"]
+    lines.append("Identities:")
+    lines += ["{0}:{1}:1416335620:user{2}".format(PUBKEY_FROM, SIGNATURE, i)
+              for i in range(nb_transactions // 10)]
+    lines.append("Joiners:")
+    lines += ["{0}:{1}:0:{2}:1416335620:user{3}".format(PUBKEY_FROM, SIGNATURE, HASH, i)
+              for i in range(nb_transactions // 10)]
+    lines.append("Actives:")
+    lines.append("Leavers:")
+    lines.append("Excluded:")
+    lines.append("Certifications:")
+    lines += ["{0}:{1}:0:{2}".format(PUBKEY_FROM, PUBKEY_TO, SIGNATURE)
+              for i in range(nb_transactions // 2)]
+    lines.append("Transactions:")
+    for i in range(nb_transactions):
+        lines += ["TX:1:1:2:2:1", PUBKEY_FROM,
+                  "0:D:{0}:{1}:100".format(i, HASH),
+                  "1:T:{0}:{1}:50".format(i, HASH),
+                  PUBKEY_TO + ":120", PUBKEY_FROM + ":30",
+                  "transaction {0}".format(i), SIGNATURE]
+    lines.append(SIGNATURE)
+    return "\n".join(lines) + "\n"
+
+
+def measure(lib_path, nb_transactions, nb_rounds):
+    '''
+    Measure the parser of the ucoinpy package found in a lib directory.
+    '''
+    sys.path.insert(0, lib_path)
+    from ucoinpy.documents.block import Block
+
+    raw = sample_block(nb_transactions)
+    assert len(Block.from_signed_raw(raw).transactions) == nb_transactions
+    for (name, parse) in (("full parse", lambda: Block.from_signed_raw(raw).transactions),
+                          ("header only", lambda: Block.from_signed_raw(raw).mediantime)):
+        duration = min(timeit.repeat(parse, number=nb_rounds, repeat=3))
+        print("{0} : {1:.3f} ms per block".format(name, duration * 1000 / nb_rounds))
+
+
+def export_lib(revision, path):
+    '''
+    Export the lib directory of a git revision.
+
+    :return: The path of the exported lib directory
+    '''
+    archive = subprocess.check_output(['git', 'archive', revision, 'lib'], cwd=ROOT)
+    with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+        tar.extractall(path)
+    return os.path.join(path, 'lib')
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--measure':
+        measure(sys.argv[2], int(sys.argv[3]), int(sys.argv[4]))
+        sys.exit(0)
+
+    nb_transactions = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    nb_rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    baseline = sys.argv[3] if len(sys.argv) > 3 else None
+
+    print("Block of {0} transactions, {1} bytes, {2} rounds".format(nb_transactions,
+                                                                    len(sample_block(nb_transactions)),
+                                                                    nb_rounds))
+    temp_path = tempfile.mkdtemp()
+    try:
+        revisions = [("working tree", os.path.join(ROOT, 'lib'))]
+        if baseline is not None:
+            revisions.append((baseline, export_lib(baseline, temp_path)))
+        for (label, lib_path) in revisions:
+            output = subprocess.check_output([sys.executable, os.path.abspath(__file__), '--measure',
+                                              lib_path, str(nb_transactions), str(nb_rounds)],
+                                             universal_newlines=True)
+            for line in output.splitlines():
+                print("{0}, {1}".format(label, line))
+    finally:
+        shutil.rmtree(temp_path)
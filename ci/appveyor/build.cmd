@@ -15,6 +15,7 @@ pip install pylibscrypt
 pip install libnacl
 pip install requests
 pip install base58
+pip install "aiohttp>=3.3"
 
 python gen_resources.py
 if %errorlevel% neq 0 exit /b 1s
@@ -23,11 +23,19 @@ __author__      = 'Caner Candan'
 __version__     = '0.10.0'
 __nonsense__    = 'uCoin'
 
-import requests, logging, json
+import requests, logging, json, threading, time, inspect, codecs, collections
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
 # import pylibscrypt
 
 logger = logging.getLogger("ucoin")
 
+# Transports of the requests. aiohttp is only imported
+# when a request is sent with the asyncio transport.
+REQUESTS = 'requests'
+AIOHTTP = 'aiohttp'
+
 
 class ConnectionHandler(object):
     """Helper class used by other API classes to ease passing server connection information."""
@@ -45,10 +53,401 @@ class ConnectionHandler(object):
     def __str__(self):
         return 'connection info: %s:%d' % (self.server, self.port)
 
+    def __eq__(self, other):
+        return isinstance(other, ConnectionHandler) and \
+            (self.server, self.port) == (other.server, other.port)
+
+    def __hash__(self):
+        return hash((self.server, self.port))
+
+
+class SessionPool(object):
+    """
+    Registry of keep-alive HTTP sessions, one per node (server, port).
+
+    Every request sent to the same node reuses the same session and
+    so its already opened TCP connections.
+    Sessions which were not used during `idle_timeout` seconds are closed.
+    """
+
+    pool_size = 4
+    idle_timeout = 60
+
+    _sessions = {}
+    _aio_sessions = {}
+    _pool_sizes = {}
+    _lock = threading.Lock()
+    _last_eviction = 0
+
+    @classmethod
+    def configure(cls, pool_size=None, idle_timeout=None):
+        """
+        Change the default pool parameters.
+        Only sessions opened after this call use the new pool size.
+
+        Arguments:
+        - `pool_size`: max number of kept alive connections per node
+        - `idle_timeout`: seconds before an unused session is closed
+        """
+        if pool_size is not None:
+            cls.pool_size = pool_size
+        if idle_timeout is not None:
+            cls.idle_timeout = idle_timeout
+
+    @classmethod
+    def set_pool_size(cls, connection_handler, pool_size):
+        """
+        Set the number of kept alive connections to a given node.
+        The current session of this node is closed if it exists.
+
+        Arguments:
+        - `connection_handler`: the node connection handler
+        - `pool_size`: max number of kept alive connections to this node
+        """
+        with cls._lock:
+            cls._pool_sizes[connection_handler] = pool_size
+            entry = cls._sessions.pop(connection_handler, None)
+        if entry:
+            entry[0].close()
+
+    @classmethod
+    def node_pool_size(cls, connection_handler):
+        """
+        Get the number of kept alive connections to a given node.
+
+        Arguments:
+        - `connection_handler`: the node connection handler
+        """
+        return cls._pool_sizes.get(connection_handler, cls.pool_size)
+
+    @classmethod
+    def session(cls, connection_handler):
+        """
+        Get the session of a node, opening it if needed.
+
+        Arguments:
+        - `connection_handler`: the node connection handler
+        """
+        now = time.time()
+        if now - cls._last_eviction > cls.idle_timeout:
+            cls.evict_idle()
+
+        with cls._lock:
+            entry = cls._sessions.get(connection_handler)
+            if entry is None:
+                pool_size = cls.node_pool_size(connection_handler)
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                entry = [session, now]
+                cls._sessions[connection_handler] = entry
+            else:
+                entry[1] = now
+            return entry[0]
+
+    @classmethod
+    def aio_session(cls, connection_handler):
+        """
+        Get the asyncio session of a node for the running event loop,
+        opening it if needed.
+        Idle connections are closed by the session connector after
+        `idle_timeout` seconds.
+
+        Arguments:
+        - `connection_handler`: the node connection handler
+        """
+        import aiohttp
+
+        loop = asyncio.get_event_loop()
+        with cls._lock:
+            session = cls._aio_sessions.get((loop, connection_handler))
+            if session is None or session.closed:
+                pool_size = cls.node_pool_size(connection_handler)
+                connector = aiohttp.TCPConnector(limit_per_host=pool_size,
+                                                 keepalive_timeout=cls.idle_timeout)
+                session = aiohttp.ClientSession(connector=connector)
+                cls._aio_sessions[(loop, connection_handler)] = session
+            return session
+
+    @classmethod
+    async def close_all_async(cls):
+        """
+        Close every asyncio session opened in the running event loop.
+        """
+        loop = asyncio.get_event_loop()
+        with cls._lock:
+            keys = [k for k in cls._aio_sessions if k[0] is loop]
+            sessions = [cls._aio_sessions.pop(k) for k in keys]
+        for session in sessions:
+            await session.close()
+
+    @classmethod
+    def evict_idle(cls):
+        """
+        Close the sessions which were not used during `idle_timeout` seconds.
+        """
+        now = time.time()
+        with cls._lock:
+            cls._last_eviction = now
+            idle = [c for c, entry in cls._sessions.items()
+                    if now - entry[1] > cls.idle_timeout]
+            evicted = [cls._sessions.pop(c)[0] for c in idle]
+        for session in evicted:
+            session.close()
+
+    @classmethod
+    def close_all(cls):
+        """
+        Close every opened session.
+        """
+        with cls._lock:
+            sessions = [entry[0] for entry in cls._sessions.values()]
+            cls._sessions = {}
+        for session in sessions:
+            session.close()
+
+
+class JsonArrayStream(object):
+    """
+    Incremental decoder of a json array received by chunks.
+    Each item of the array is given back as soon as it is complete.
+    """
+
+    def __init__(self):
+        self._decoder = json.JSONDecoder()
+        self._text_decoder = codecs.getincrementaldecoder('utf-8')()
+        self._buffer = ""
+        self._started = False
+
+    def feed(self, chunk):
+        """
+        Feed the stream with a chunk of the response body.
+
+        Arguments:
+        - `chunk`: the received bytes
+
+        Returns the list of the items completed by this chunk.
+        """
+        self._buffer += self._text_decoder.decode(chunk)
+        items = []
+        pos = 0
+        length = len(self._buffer)
+        while True:
+            while pos < length and self._buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if pos == length:
+                break
+            if not self._started:
+                if self._buffer[pos] != '[':
+                    raise ValueError('json array expected')
+                self._started = True
+                pos += 1
+                continue
+            if self._buffer[pos] == ']':
+                pos = length
+                break
+            try:
+                item, pos_end = self._decoder.raw_decode(self._buffer, pos)
+            except ValueError:
+                # The item is not fully received yet
+                break
+            items.append(item)
+            pos = pos_end
+        self._buffer = self._buffer[pos:]
+        return items
+
+
+class AsyncResponse(object):
+    """
+    Response of a request sent with the asyncio transport.
+    The request is only sent when awaiting its json method.
+    """
+
+    def __init__(self, api, method, path, **kwargs):
+        """
+        Arguments:
+        - `api`: the API object sending the request
+        - `method`: the HTTP method, GET or POST
+        - `path`: the request path
+        - `kwargs`: the aiohttp request arguments (params or data)
+        """
+        self.connection_handler = api.connection_handler
+        self.headers = api.headers
+        self.method = method
+        self.url = api.reverse_url(path)
+        self.timeout = api.timeout
+        self.kwargs = kwargs
+
+    def iter_json_array(self):
+        """
+        Send the request and give back an asynchronous iterator
+        over the items of its json array answer, as they arrive.
+        """
+
+        return AsyncJsonArray(self)
+
+    async def send(self, timeout):
+        """
+        Send the request and give back its response, once its headers are received.
+        The response must be released by the caller.
+
+        Arguments:
+        - `timeout`: the aiohttp.ClientTimeout of the request
+        """
+
+        session = SessionPool.aio_session(self.connection_handler)
+        response = await session.request(self.method, self.url, headers=self.headers,
+                                         timeout=timeout, **self.kwargs)
+        if response.status != 200:
+            try:
+                text = await response.text()
+            finally:
+                response.release()
+            raise ValueError('status code != 200 => %d (%s)' % (response.status, text))
+
+        return response
+
+    async def json(self):
+        """Send the request and decode its json answer."""
+
+        import aiohttp
+
+        response = await self.send(aiohttp.ClientTimeout(total=self.timeout))
+        try:
+            return await response.json(content_type=None)
+        finally:
+            response.release()
+
+
+class AsyncJsonArray(object):
+    """
+    Asynchronous iterator over the items of a json array answer.
+    The request is sent on the first iteration, and its response is released
+    once the array is fully read or when aclose is awaited.
+    """
+
+    def __init__(self, request):
+        """
+        Arguments:
+        - `request`: the AsyncResponse of the request
+        """
+        self.request = request
+        self._response = None
+        self._stream = JsonArrayStream()
+        self._items = collections.deque()
+        self._done = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        import aiohttp
+
+        while len(self._items) == 0:
+            if self._done:
+                raise StopAsyncIteration
+            try:
+                if self._response is None:
+                    timeout = aiohttp.ClientTimeout(total=None, sock_read=self.request.timeout)
+                    self._response = await self.request.send(timeout)
+
+                chunk = await self._response.content.readany()
+                if chunk:
+                    self._items.extend(self._stream.feed(chunk))
+                else:
+                    self._done = True
+                    self._response.release()
+            except BaseException:
+                await self.aclose()
+                raise
+        return self._items.popleft()
+
+    async def aclose(self):
+        """Stop the iteration and close the response."""
+
+        self._done = True
+        self._items.clear()
+        if self._response is not None:
+            self._response.close()
+
+
+class AsyncMerkleLeaves(object):
+    """
+    Asynchronous iterator over the leaves of a merkle tree.
+    The known leaves are given back first, then the missing leaves
+    as they are fetched, at most `parallelism` at the same time.
+    """
+
+    def __init__(self, api, path, begin, end, known, parallelism):
+        """
+        Arguments:
+        - `api`: the API object sending the requests
+        - `path`, `begin`, `end`, `known`, `parallelism`: see API.merkle_easy_parser
+        """
+        self.api = api
+        self.path = path
+        self.begin = begin
+        self.end = end
+        self.known = known
+        self.parallelism = parallelism
+        self._known_leaves = collections.deque()
+        self._tasks = []
+        self._pending = None
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._pending is None:
+            await self._start()
+
+        if len(self._known_leaves) > 0:
+            return self._known_leaves.popleft()
+
+        try:
+            next_leaf = next(self._pending)
+        except StopIteration:
+            raise StopAsyncIteration
+        try:
+            return await next_leaf
+        except BaseException:
+            await self.aclose()
+            raise
+
+    async def _start(self):
+        root = await AsyncResponse(self.api, 'GET', self.path, params={'leaves': 'true'}).json()
+        missing = []
+        for leaf in root['leaves'][self.begin:self.end]:
+            if leaf in self.known:
+                self._known_leaves.append(self.known[leaf])
+            else:
+                missing.append(leaf)
+
+        semaphore = asyncio.Semaphore(self.parallelism)
+        self._tasks = [asyncio.ensure_future(self._fetch(semaphore, leaf)) for leaf in missing]
+        self._pending = iter(asyncio.as_completed(self._tasks))
+
+    async def _fetch(self, semaphore, leaf):
+        async with semaphore:
+            data = await AsyncResponse(self.api, 'GET', self.path, params={'leaf': leaf}).json()
+            return data['leaf']
+
+    async def aclose(self):
+        """Stop the iteration and cancel the leaves being fetched."""
+
+        self._known_leaves.clear()
+        self._pending = iter(())
+        for task in self._tasks:
+            task.cancel()
+
 
 class API(object):
     """APIRequest is a class used as an interface. The intermediate derivated classes are the modules and the leaf classes are the API requests."""
 
+    # Seconds to wait for the node before the request fails
+    timeout = 15
+
     def __init__(self, connection_handler, module):
         """
         Asks a module in order to create the url used then by derivated classes.
@@ -91,6 +490,31 @@ class API(object):
 
         return data
 
+    async def get_async(self, **kwargs):
+        """
+        Awaitable wrapper of overloaded __get__ method, using the asyncio transport.
+        Merkle requests give back an asynchronous generator.
+        """
+
+        return await self._run_async(self.__get__, **kwargs)
+
+    async def post_async(self, **kwargs):
+        """Awaitable wrapper of overloaded __post__ method, using the asyncio transport."""
+
+        return await self._run_async(self.__post__, **kwargs)
+
+    async def _run_async(self, method, **kwargs):
+        """
+        Run a __get__ or __post__ method with the asyncio transport.
+        The requests wrappers then give back AsyncResponse objects,
+        so the method returns the awaitable of the decoded answer.
+        """
+        data = method(transport=AIOHTTP, **kwargs)
+
+        if inspect.isawaitable(data):
+            data = await data
+        return data
+
     def __get__(self, **kwargs):
         """interface purpose for GET request"""
 
@@ -101,44 +525,126 @@ class API(object):
 
         pass
 
-    def requests_get(self, path, **kwargs):
+    def requests_get(self, path, transport=REQUESTS, **kwargs):
         """
         Requests GET wrapper in order to use API parameters.
 
         Arguments:
         - `path`: the request path
+        - `transport`: REQUESTS, or AIOHTTP to get back an AsyncResponse
         """
+        if transport == AIOHTTP:
+            return AsyncResponse(self, 'GET', path, params=kwargs)
 
-        response = requests.get(self.reverse_url(path), params=kwargs,
-                                headers=self.headers, timeout=15)
+        session = SessionPool.session(self.connection_handler)
+        response = session.get(self.reverse_url(path), params=kwargs,
+                               headers=self.headers, timeout=self.timeout)
 
         if response.status_code != 200:
             raise ValueError('status code != 200 => %d (%s)' % (response.status_code, response.text))
 
         return response
 
-    def requests_post(self, path, **kwargs):
+    def requests_get_array(self, path, transport=REQUESTS, **kwargs):
+        """
+        Requests GET wrapper for requests answering a json array.
+        The response is streamed and its items are yielded as they arrive.
+
+        Arguments:
+        - `path`: the request path
+        - `transport`: REQUESTS, or AIOHTTP to get back an asynchronous iterator
+        """
+        if transport == AIOHTTP:
+            return AsyncResponse(self, 'GET', path, params=kwargs).iter_json_array()
+
+        return self._iter_json_array(path, **kwargs)
+
+    def _iter_json_array(self, path, **kwargs):
+        session = SessionPool.session(self.connection_handler)
+        response = session.get(self.reverse_url(path), params=kwargs,
+                               headers=self.headers, timeout=self.timeout, stream=True)
+        try:
+            if response.status_code != 200:
+                raise ValueError('status code != 200 => %d (%s)' % (response.status_code, response.text))
+
+            stream = JsonArrayStream()
+            for chunk in response.iter_content(chunk_size=8192):
+                for item in stream.feed(chunk):
+                    yield item
+        finally:
+            response.close()
+
+    def requests_post(self, path, transport=REQUESTS, **kwargs):
         """
         Requests POST wrapper in order to use API parameters.
 
         Arguments:
         - `path`: the request path
+        - `transport`: REQUESTS, or AIOHTTP to get back an AsyncResponse
         """
         if 'self_' in kwargs:
             kwargs['self'] = kwargs.pop('self_')
 
         logging.debug("POST : {0}".format(kwargs))
-        response = requests.post(self.reverse_url(path), data=kwargs, headers=self.headers,
-                                 timeout=15)
+        if transport == AIOHTTP:
+            return AsyncResponse(self, 'POST', path, data=kwargs)
+
+        session = SessionPool.session(self.connection_handler)
+        response = session.post(self.reverse_url(path), data=kwargs, headers=self.headers,
+                                timeout=self.timeout)
 
         if response.status_code != 200:
             raise ValueError('status code != 200 => %d (%s)' % (response.status_code, response.text))
 
         return response
 
-    def merkle_easy_parser(self, path, begin=None, end=None):
+    def merkle_easy_parser(self, path, begin=None, end=None, known=None, parallelism=None,
+                           transport=REQUESTS):
+        """
+        Get the leaves of a merkle tree.
+        Leaves are fetched concurrently and yielded as they arrive,
+        so their order is not the one of the merkle tree.
+
+        Arguments:
+        - `path`: the request path
+        - `begin`, `end`: the range of the leaves to get
+        - `known`: dict of already known leaves by hash. These leaves are yielded without being fetched.
+        - `parallelism`: max number of leaves fetched at the same time,
+        defaults to the node pool size
+        - `transport`: REQUESTS, or AIOHTTP to get back an asynchronous iterator
+        """
+        if known is None:
+            known = {}
+        if parallelism is None:
+            parallelism = SessionPool.node_pool_size(self.connection_handler)
+
+        if transport == AIOHTTP:
+            return AsyncMerkleLeaves(self, path, begin, end, known, parallelism)
+        return self._merkle_leaves(path, begin, end, known, parallelism)
+
+    def _merkle_leaves(self, path, begin, end, known, parallelism):
         root = self.requests_get(path, leaves='true').json()
+        missing = []
         for leaf in root['leaves'][begin:end]:
-            yield self.requests_get(path, leaf=leaf).json()['leaf']
+            if leaf in known:
+                yield known[leaf]
+            else:
+                missing.append(leaf)
+
+        if len(missing) == 0:
+            return
+
+        executor = ThreadPoolExecutor(max_workers=min(parallelism, len(missing)))
+        futures = [executor.submit(self._merkle_leaf, path, leaf) for leaf in missing]
+        try:
+            for future in as_completed(futures):
+                yield future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    def _merkle_leaf(self, path, leaf):
+        return self.requests_get(path, leaf=leaf).json()['leaf']
 
 from . import network, blockchain, tx, wot, node
@@ -16,7 +16,8 @@
 # Caner Candan <caner@candan.fr>, http://caner.candan.fr
 #
 
-from .. import API, logging
+from .. import API, AsyncResponse, REQUESTS, AIOHTTP, logging
+from ....documents.block import Block as BlockDocument
 
 logger = logging.getLogger("ucoin/blockchain")
 
@@ -75,6 +76,97 @@ class Block(Blockchain):
         return self.requests_post('/block', **kwargs).json()
 
 
+class Blocks(Blockchain):
+    """GET a range of blocks from the blockchain, parsed as Block documents or as json data."""
+
+    # Max number of blocks downloaded by request
+    chunk_size = 100
+
+    def __init__(self, connection_handler, count, from_, parsed=True):
+        """
+        Use the count and from_ parameters in order to select the blocks range.
+
+        Arguments:
+        - `count`: number of blocks to get
+        - `from_`: number of the first block
+        - `parsed`: yield Block documents if True, else the blocks json data
+        """
+
+        super(Blocks, self).__init__(connection_handler)
+
+        self.count = count
+        self.from_ = from_
+        self.parsed = parsed
+
+    def __get__(self, transport=REQUESTS, **kwargs):
+        """creates a generator with one Block document or json data per iteration."""
+        assert self.count is not None
+        assert self.from_ is not None
+
+        if transport == AIOHTTP:
+            return AsyncBlocks(self, **kwargs)
+        return self._blocks(**kwargs)
+
+    def _chunks(self):
+        end = self.from_ + self.count
+        for start in range(self.from_, end, self.chunk_size):
+            yield (min(self.chunk_size, end - start), start)
+
+    def _blocks(self, **kwargs):
+        for (count, start) in self._chunks():
+            for data in self.requests_get_array('/blocks/%d/%d' % (count, start), **kwargs):
+                yield self._block(data)
+
+    def _block(self, data):
+        if not self.parsed:
+            return data
+        return BlockDocument.from_signed_raw("{0}{1}\n".format(data['raw'],
+                                                              data['signature']))
+
+
+class AsyncBlocks(object):
+    """Asynchronous iterator over the blocks of a Blocks request, downloaded chunk by chunk."""
+
+    def __init__(self, blocks, **kwargs):
+        """
+        Arguments:
+        - `blocks`: the Blocks request
+        - `kwargs`: the request parameters
+        """
+        self.blocks = blocks
+        self.kwargs = kwargs
+        self._chunks = blocks._chunks()
+        self._array = None
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while True:
+            if self._array is None:
+                try:
+                    (count, start) = next(self._chunks)
+                except StopIteration:
+                    raise StopAsyncIteration
+                response = AsyncResponse(self.blocks, 'GET', '/blocks/%d/%d' % (count, start),
+                                         params=self.kwargs)
+                self._array = response.iter_json_array()
+            try:
+                data = await self._array.__anext__()
+            except StopAsyncIteration:
+                self._array = None
+                continue
+            return self.blocks._block(data)
+
+    async def aclose(self):
+        """Stop the iteration and close the current chunk response."""
+
+        self._chunks = iter(())
+        if self._array is not None:
+            await self._array.aclose()
+            self._array = None
+
+
 class Current(Blockchain):
     """GET, same as block/[number], but return last accepted block."""
 
@@ -17,6 +17,7 @@
 #
 
 from .. import Network, logging
+from ... import REQUESTS
 
 logger = logging.getLogger("ucoin/network/peering")
 
@@ -29,10 +30,14 @@ class Base(Network):
 class Peers(Base):
     """GET peering entries of every node inside the currency network."""
 
-    def __get__(self, **kwargs):
-        """creates a generator with one peering entry per iteration."""
+    def __get__(self, known_leaves=None, **kwargs):
+        """
+        creates a generator with one peering entry per iteration.
+        Entries of known_leaves, a dict of leaves by hash, are not requested again.
+        """
 
-        return self.merkle_easy_parser('/peers')
+        return self.merkle_easy_parser('/peers', known=known_leaves,
+                                       transport=kwargs.get('transport', REQUESTS))
 
     def __post__(self, **kwargs):
         assert 'entry' in kwargs
@@ -5,11 +5,14 @@ Created on 3 déc. 2014
 '''
 import base58
 import base64
+import hashlib
 import re
 import logging
 from ..key import Base58Encoder
 
 class Document:
+    __slots__ = ('version', 'currency', 'signatures', '_signed_raw', '_sha1')
+
     re_version = re.compile("Version: ([0-9]+)\n")
     re_currency = re.compile("Currency: ([^\n]+)\n")
     re_signature = re.compile("([A-Za-z0-9+/]+(?:=|==)?)\n")
@@ -21,6 +24,10 @@ class Document:
             self.signatures = [s for s in signatures if s is not None]
         else:
             self.signatures = []
+        # Documents are immutable once signed,
+        # so their signed raw and hash are computed only once
+        self._signed_raw = None
+        self._sha1 = None
 
     def sign(self, keys):
         '''
@@ -28,6 +35,8 @@ class Document:
         Warning : current signatures will be replaced with the new ones.
         '''
         self.signatures = []
+        self._signed_raw = None
+        self._sha1 = None
         for key in keys:
             signing = base64.b64encode(key.signature(bytes(self.raw(), 'ascii')))
             logging.debug("Signature : \n{0}".format(signing.decode("ascii")))
@@ -38,7 +47,15 @@ class Document:
         If keys are None, returns the raw + current signatures
         If keys are present, returns the raw signed by these keys
         '''
-        raw = self.raw()
-        signed = "\n".join(self.signatures)
-        signed_raw = raw + signed + "\n"
-        return signed_raw
+        if self._signed_raw is None:
+            self._signed_raw = "".join((self.raw(), "\n".join(self.signatures), "\n"))
+        return self._signed_raw
+
+    @property
+    def sha1(self):
+        '''
+        The hash of the signed raw, as an uppercase hexadecimal string
+        '''
+        if self._sha1 is None:
+            self._sha1 = hashlib.sha1(self.signed_raw().encode("ascii")).hexdigest().upper()
+        return self._sha1
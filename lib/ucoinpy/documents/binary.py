@@ -0,0 +1,397 @@
+from .block import Block
+from .certification import SelfCertification, Certification
+from .membership import Membership
+from .transaction import Transaction, InputSource, OutputSource
+from .peer import Peer, UnknownEndpoint, BMAEndpoint
+
+# Compact binary encoding of the documents, to store them locally
+# and load them back without parsing their raw.
+#
+# Format :
+# MAGIC FORMAT_VERSION TYPE FIELDS
+#
+# The fields are written in a fixed order for each type of document.
+# Integers are unsigned varints. Strings are utf-8 encoded and written
+# once per document : the next occurrences of a string (pubkeys, hashes,
+# the currency...) are references to its first occurrence.
+# The signed raw of a decoded document is the signed raw of the
+# encoded document.
+
+MAGIC = b'UCB'
+FORMAT_VERSION = 1
+
+BLOCK = 1
+TRANSACTION = 2
+INPUT_SOURCE = 3
+OUTPUT_SOURCE = 4
+PEER = 5
+
+_ENDPOINT_UNKNOWN = 0
+_ENDPOINT_BMA = 1
+
+
+class DecodeError(ValueError):
+    '''
+    Raised when some data is not a document encoded by dumps,
+    or when the encoded document is truncated or corrupt.
+    '''
+    pass
+
+
+class _Writer():
+    '''
+    Write the fields of a document in a buffer.
+    '''
+    def __init__(self):
+        self.buffer = bytearray()
+        self.strings = {}
+
+    def uint(self, value):
+        while value >= 0x80:
+            self.buffer.append((value & 0x7F) | 0x80)
+            value >>= 7
+        self.buffer.append(value)
+
+    def optional_uint(self, value):
+        self.uint(0 if value is None else value + 1)
+
+    def string(self, value):
+        # Even headers are new strings with their length,
+        # odd headers are references to a string already written
+        index = self.strings.get(value)
+        if index is not None:
+            self.uint(index << 1 | 1)
+        else:
+            self.strings[value] = len(self.strings)
+            data = value.encode('utf-8')
+            self.uint(len(data) << 1)
+            self.buffer += data
+
+    def optional_string(self, value):
+        if value is None:
+            self.uint(0)
+        else:
+            self.uint(1)
+            self.string(value)
+
+    def strings_list(self, values):
+        self.uint(len(values))
+        for value in values:
+            self.string(value)
+
+    def documents(self, write, documents):
+        self.uint(len(documents))
+        for document in documents:
+            write(self, document)
+
+
+class _Reader():
+    '''
+    Read the fields of a document from a buffer.
+    '''
+    def __init__(self, data, pos):
+        self.data = data
+        self.pos = pos
+        self.strings = []
+
+    def byte(self):
+        if self.pos >= len(self.data):
+            raise DecodeError("Truncated document at offset {0}".format(self.pos))
+        byte = self.data[self.pos]
+        self.pos += 1
+        return byte
+
+    def uint(self):
+        byte = self.byte()
+        if byte < 0x80:
+            return byte
+        value = byte & 0x7F
+        shift = 7
+        while True:
+            byte = self.byte()
+            value |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                return value
+            shift += 7
+
+    def optional_uint(self):
+        value = self.uint()
+        return None if value == 0 else value - 1
+
+    def string(self):
+        header = self.uint()
+        if header & 1:
+            if header >> 1 >= len(self.strings):
+                raise DecodeError("Unknown string reference {0} at offset {1}"
+                                  .format(header >> 1, self.pos))
+            return self.strings[header >> 1]
+        end = self.pos + (header >> 1)
+        if end > len(self.data):
+            raise DecodeError("Truncated document at offset {0}".format(self.pos))
+        try:
+            value = self.data[self.pos:end].decode('utf-8')
+        except UnicodeDecodeError:
+            raise DecodeError("Invalid string at offset {0}".format(self.pos))
+        self.pos = end
+        self.strings.append(value)
+        return value
+
+    def optional_string(self):
+        return self.string() if self.uint() else None
+
+    def strings_list(self):
+        return [self.string() for i in range(self.uint())]
+
+    def documents(self, read, *args):
+        return [read(self, *args) for i in range(self.uint())]
+
+
+def _write_input_source(writer, input_source):
+    writer.optional_uint(input_source.index)
+    writer.string(input_source.source)
+    writer.uint(input_source.number)
+    writer.string(input_source.txhash)
+    writer.uint(input_source.amount)
+
+
+def _read_input_source(reader):
+    return InputSource(reader.optional_uint(), reader.string(), reader.uint(),
+                       reader.string(), reader.uint())
+
+
+def _write_output_source(writer, output_source):
+    writer.string(output_source.pubkey)
+    writer.uint(output_source.amount)
+
+
+def _read_output_source(reader):
+    return OutputSource(reader.string(), reader.uint())
+
+
+def _write_transaction(writer, transaction):
+    writer.uint(transaction.version)
+    writer.string(transaction.currency)
+    writer.strings_list(transaction.issuers)
+    writer.documents(_write_input_source, transaction.inputs)
+    writer.documents(_write_output_source, transaction.outputs)
+    writer.string(transaction.comment)
+    writer.strings_list(transaction.signatures)
+
+
+def _read_transaction(reader):
+    version = reader.uint()
+    currency = reader.string()
+    issuers = reader.strings_list()
+    inputs = reader.documents(_read_input_source)
+    outputs = reader.documents(_read_output_source)
+    comment = reader.string()
+    signatures = reader.strings_list()
+    return Transaction(version, currency, issuers, inputs, outputs,
+                       comment, signatures)
+
+
+def _write_selfcert(writer, selfcert):
+    writer.string(selfcert.pubkey)
+    writer.optional_string(selfcert.signatures[0] if selfcert.signatures else None)
+    writer.uint(selfcert.timestamp)
+    writer.string(selfcert.uid)
+
+
+def _read_selfcert(reader, version, currency):
+    pubkey = reader.string()
+    signature = reader.optional_string()
+    timestamp = reader.uint()
+    uid = reader.string()
+    return SelfCertification(version, currency, pubkey, timestamp, uid, signature)
+
+
+def _write_membership(writer, membership):
+    writer.string(membership.issuer)
+    writer.string(membership.signatures[0])
+    writer.uint(membership.block_number)
+    writer.string(membership.block_hash)
+    writer.uint(membership.cert_ts)
+    writer.string(membership.uid)
+
+
+def _read_membership(reader, version, currency, membership_type):
+    issuer = reader.string()
+    signature = reader.string()
+    block_number = reader.uint()
+    block_hash = reader.string()
+    cert_ts = reader.uint()
+    uid = reader.string()
+    return Membership(version, currency, issuer, block_number, block_hash,
+                      membership_type, uid, cert_ts, signature)
+
+
+def _write_certification(writer, certification):
+    writer.string(certification.pubkey_from)
+    writer.string(certification.pubkey_to)
+    writer.uint(certification.blocknumber)
+    writer.optional_string(certification.blockhash)
+    writer.string(certification.signatures[0])
+
+
+def _read_certification(reader, version, currency):
+    pubkey_from = reader.string()
+    pubkey_to = reader.string()
+    blocknumber = reader.uint()
+    blockhash = reader.optional_string()
+    signature = reader.string()
+    return Certification(version, currency, pubkey_from, pubkey_to,
+                         blocknumber, blockhash, signature)
+
+
+def _write_block(writer, block):
+    writer.uint(block.version)
+    writer.string(block.currency)
+    writer.uint(block.noonce)
+    writer.uint(block.number)
+    writer.uint(block.powmin)
+    writer.uint(block.time)
+    writer.uint(block.mediantime)
+    writer.optional_uint(block.ud)
+    writer.string(block.issuer)
+    writer.optional_string(block.prev_hash)
+    writer.optional_string(block.prev_issuer)
+    if block.parameters is None:
+        writer.uint(0)
+    else:
+        writer.uint(1)
+        writer.strings_list(block.parameters)
+    writer.uint(block.members_count)
+    writer.documents(_write_selfcert, block.identities)
+    writer.documents(_write_membership, block.joiners)
+    writer.documents(_write_membership, block.actives)
+    writer.documents(_write_membership, block.leavers)
+    writer.strings_list(block.excluded)
+    writer.documents(_write_certification, block.certifications)
+    writer.documents(_write_transaction, block.transactions)
+    writer.string(block.signatures[0])
+
+
+def _read_block(reader):
+    version = reader.uint()
+    currency = reader.string()
+    noonce = reader.uint()
+    number = reader.uint()
+    powmin = reader.uint()
+    time = reader.uint()
+    mediantime = reader.uint()
+    ud = reader.optional_uint()
+    issuer = reader.string()
+    prev_hash = reader.optional_string()
+    prev_issuer = reader.optional_string()
+    parameters = tuple(reader.strings_list()) if reader.uint() else None
+    members_count = reader.uint()
+    identities = reader.documents(_read_selfcert, version, currency)
+    joiners = reader.documents(_read_membership, version, currency, "IN")
+    actives = reader.documents(_read_membership, version, currency, "IN")
+    leavers = reader.documents(_read_membership, version, currency, "OUT")
+    excluded = reader.strings_list()
+    certifications = reader.documents(_read_certification, version, currency)
+    transactions = reader.documents(_read_transaction)
+    signature = reader.string()
+    return Block(version, currency, noonce, number, powmin, time,
+                 mediantime, ud, issuer, prev_hash, prev_issuer,
+                 parameters, members_count, identities, joiners,
+                 actives, leavers, excluded, certifications,
+                 transactions, signature)
+
+
+def _write_peer(writer, peer):
+    writer.uint(peer.version)
+    writer.string(peer.currency)
+    writer.string(peer.pubkey)
+    writer.string(peer.blockid)
+    writer.uint(len(peer.endpoints))
+    for endpoint in peer.endpoints:
+        if isinstance(endpoint, BMAEndpoint):
+            writer.uint(_ENDPOINT_BMA)
+            writer.optional_string(endpoint.server)
+            writer.optional_string(endpoint.ipv4)
+            writer.optional_string(endpoint.ipv6)
+            writer.uint(endpoint.port)
+        else:
+            writer.uint(_ENDPOINT_UNKNOWN)
+            writer.string(endpoint.api)
+            writer.strings_list(endpoint.properties)
+    writer.string(peer.signatures[0])
+
+
+def _read_peer(reader):
+    version = reader.uint()
+    currency = reader.string()
+    pubkey = reader.string()
+    blockid = reader.string()
+    endpoints = []
+    for i in range(reader.uint()):
+        endpoint_type = reader.uint()
+        if endpoint_type == _ENDPOINT_BMA:
+            endpoints.append(BMAEndpoint(reader.optional_string(), reader.optional_string(),
+                                         reader.optional_string(), reader.uint()))
+        elif endpoint_type == _ENDPOINT_UNKNOWN:
+            endpoints.append(UnknownEndpoint(reader.string(), reader.strings_list()))
+        else:
+            raise DecodeError("Unknown endpoint type : {0}".format(endpoint_type))
+    signature = reader.string()
+    return Peer(version, currency, pubkey, blockid, endpoints, signature)
+
+
+# The types of documents, tested in order
+_TYPES = ((Block, BLOCK, _write_block),
+          (Transaction, TRANSACTION, _write_transaction),
+          (InputSource, INPUT_SOURCE, _write_input_source),
+          (OutputSource, OUTPUT_SOURCE, _write_output_source),
+          (Peer, PEER, _write_peer))
+
+_READERS = {BLOCK: _read_block,
+            TRANSACTION: _read_transaction,
+            INPUT_SOURCE: _read_input_source,
+            OUTPUT_SOURCE: _read_output_source,
+            PEER: _read_peer}
+
+
+def dumps(document):
+    '''
+    Encode a document.
+
+    :param document: A Block, Transaction, InputSource, OutputSource or Peer
+    :return: The encoded document
+    :rtype: bytes
+    '''
+    for (cls, document_type, write) in _TYPES:
+        if isinstance(document, cls):
+            writer = _Writer()
+            writer.buffer += MAGIC
+            writer.buffer.append(FORMAT_VERSION)
+            writer.buffer.append(document_type)
+            write(writer, document)
+            return bytes(writer.buffer)
+    raise TypeError("Cannot encode {0}".format(type(document).__name__))
+
+
+def loads(data):
+    '''
+    Decode a document encoded by dumps.
+
+    :param bytes data: The encoded document
+    :return: The decoded document
+    :raise DecodeError: If the data is not an encoded document, \
+    or if it is truncated or corrupt
+    '''
+    data = bytes(data)
+    if len(data) < len(MAGIC) + 2 or data[:len(MAGIC)] != MAGIC:
+        raise DecodeError("Not an encoded document")
+    version = data[len(MAGIC)]
+    if version != FORMAT_VERSION:
+        raise DecodeError("Unsupported format version : {0}".format(version))
+    document_type = data[len(MAGIC) + 1]
+    if document_type not in _READERS:
+        raise DecodeError("Unknown document type : {0}".format(document_type))
+    reader = _Reader(data, len(MAGIC) + 2)
+    document = _READERS[document_type](reader)
+    if reader.pos != len(data):
+        raise DecodeError("Unexpected data at offset {0}".format(reader.pos))
+    return document
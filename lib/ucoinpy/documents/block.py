@@ -14,6 +14,28 @@ import re
 import logging
 
 
+def _section(name):
+    '''
+    A section of a block, decoded on first access
+    if the block was parsed from a signed raw.
+
+    :param str name: The attribute storing the section
+    '''
+    def get_section(block):
+        if block._sections_raw is not None:
+            block._decode_sections()
+        return getattr(block, name)
+
+    def set_section(block, value):
+        if block._sections_raw is not None:
+            block._decode_sections()
+        setattr(block, name, value)
+        block._signed_raw = None
+        block._sha1 = None
+
+    return property(get_section, set_section)
+
+
 class Block(Document):
     '''
 Version: VERSION
@@ -97,68 +119,118 @@ BOTTOM_SIGNATURE
         self.prev_issuer = prev_issuer
         self.parameters = parameters
         self.members_count = members_count
-        self.identities = identities
-        self.joiners = joiners
-        self.actives = actives
-        self.leavers = leavers
-        self.excluded = excluded
-        self.certifications = certifications
-        self.transactions = transactions
+        self._identities = identities
+        self._joiners = joiners
+        self._actives = actives
+        self._leavers = leavers
+        self._excluded = excluded
+        self._certifications = certifications
+        self._transactions = transactions
+        # The raw and the offset of the sections not decoded yet
+        self._sections_raw = None
+        self._sections_pos = 0
+
+    def __setattr__(self, name, value):
+        # The raw of a parsed block is a part of its signed raw,
+        # which must be computed again from the fields when one of them is changed
+        object.__setattr__(self, name, value)
+        if name[0] != '_':
+            object.__setattr__(self, '_signed_raw', None)
+            object.__setattr__(self, '_sha1', None)
 
     @classmethod
     def from_signed_raw(cls, raw):
-        lines = raw.splitlines(True)
-        n = 0
+        # The raw is walked line by line by offsets,
+        # matching each line in place without copying it.
+        # Only the header is parsed here, the sections are
+        # decoded on first access to one of them.
+        pos = 0
+        end = raw.find("\n") + 1
 
-        version = int(Block.re_version.match(lines[n]).group(1))
-        n = n + 1
+        def next_line():
+            nonlocal pos, end
+            pos = end
+            end = raw.find("\n", pos) + 1
 
-        Block.re_type.match(lines[n]).group(1)
-        n = n + 1
+        version = int(Block.re_version.match(raw, pos, end).group(1))
+        next_line()
 
-        currency = Block.re_currency.match(lines[n]).group(1)
-        n = n + 1
+        Block.re_type.match(raw, pos, end).group(1)
+        next_line()
 
-        noonce = int(Block.re_noonce.match(lines[n]).group(1))
-        n = n + 1
+        currency = Block.re_currency.match(raw, pos, end).group(1)
+        next_line()
 
-        number = int(Block.re_number.match(lines[n]).group(1))
-        n = n + 1
+        noonce = int(Block.re_noonce.match(raw, pos, end).group(1))
+        next_line()
 
-        powmin = int(Block.re_powmin.match(lines[n]).group(1))
-        n = n + 1
+        number = int(Block.re_number.match(raw, pos, end).group(1))
+        next_line()
 
-        time = int(Block.re_time.match(lines[n]).group(1))
-        n = n + 1
+        powmin = int(Block.re_powmin.match(raw, pos, end).group(1))
+        next_line()
 
-        mediantime = int(Block.re_mediantime.match(lines[n]).group(1))
-        n = n + 1
+        time = int(Block.re_time.match(raw, pos, end).group(1))
+        next_line()
 
-        ud = Block.re_universaldividend.match(lines[n])
+        mediantime = int(Block.re_mediantime.match(raw, pos, end).group(1))
+        next_line()
+
+        ud = Block.re_universaldividend.match(raw, pos, end)
         if ud is not None:
             ud = int(ud.group(1))
-            n = n + 1
+            next_line()
 
-        issuer = Block.re_issuer.match(lines[n]).group(1)
-        n = n + 1
+        issuer = Block.re_issuer.match(raw, pos, end).group(1)
+        next_line()
 
         prev_hash = None
         prev_issuer = None
         if number > 0:
-            prev_hash = Block.re_previoushash.match(lines[n]).group(1)
-            n = n + 1
+            prev_hash = Block.re_previoushash.match(raw, pos, end).group(1)
+            next_line()
 
-            prev_issuer = Block.re_previousissuer.match(lines[n]).group(1)
-            n = n + 1
+            prev_issuer = Block.re_previousissuer.match(raw, pos, end).group(1)
+            next_line()
 
         parameters = None
         if number == 0:
-            parameters = Block.re_parameters.match(lines[n]).groups()
-            n = n + 1
+            parameters = Block.re_parameters.match(raw, pos, end).groups()
+            next_line()
+
+        members_count = int(Block.re_memberscount.match(raw, pos, end).group(1))
+        next_line()
+
+        # The sections are decoded on first access
+        signature_pos = raw.rfind("\n", 0, len(raw) - 1) + 1
+        signature = Block.re_signature.match(raw, signature_pos).group(1)
+
+        block = cls(version, currency, noonce, number, powmin, time,
+                    mediantime, ud, issuer, prev_hash, prev_issuer,
+                    parameters, members_count, None, None,
+                    None, None, None, None,
+                    None, signature)
+        block._sections_raw = raw
+        block._sections_pos = pos
+        block._signed_raw = raw
+        return block
+
+    def _decode_sections(self):
+        '''
+        Decode the identities, memberships, exclusions, certifications
+        and transactions of a block parsed from a signed raw.
+        '''
+        raw = self._sections_raw
+        pos = self._sections_pos
+        end = raw.find("\n", pos) + 1
 
-        members_count = int(Block.re_memberscount.match(lines[n]).group(1))
-        n = n + 1
+        def next_line():
+            nonlocal pos, end
+            pos = end
+            end = raw.find("\n", pos) + 1
 
+        version = self.version
+        currency = self.currency
         identities = []
         joiners = []
         actives = []
@@ -167,76 +239,79 @@ BOTTOM_SIGNATURE
         certifications = []
         transactions = []
 
-        if Block.re_identities.match(lines[n]) is not None:
-            n = n + 1
-            while Block.re_joiners.match(lines[n]) is None:
-                selfcert = SelfCertification.from_inline(version, currency, lines[n])
+        if Block.re_identities.match(raw, pos, end) is not None:
+            next_line()
+            while Block.re_joiners.match(raw, pos, end) is None:
+                selfcert = SelfCertification.from_inline(version, currency, raw, pos, end)
                 identities.append(selfcert)
-                n = n + 1
+                next_line()
 
-        if Block.re_joiners.match(lines[n]):
-            n = n + 1
-            while Block.re_actives.match(lines[n]) is None:
-                membership = Membership.from_inline(version, currency, "IN", lines[n])
+        if Block.re_joiners.match(raw, pos, end):
+            next_line()
+            while Block.re_actives.match(raw, pos, end) is None:
+                membership = Membership.from_inline(version, currency, "IN", raw, pos, end)
                 joiners.append(membership)
-                n = n + 1
+                next_line()
 
-        if Block.re_actives.match(lines[n]):
-            n = n + 1
-            while Block.re_leavers.match(lines[n]) is None:
-                membership = Membership.from_inline(version, currency, "IN", lines[n])
+        if Block.re_actives.match(raw, pos, end):
+            next_line()
+            while Block.re_leavers.match(raw, pos, end) is None:
+                membership = Membership.from_inline(version, currency, "IN", raw, pos, end)
                 actives.append(membership)
-                n = n + 1
+                next_line()
 
-        if Block.re_leavers.match(lines[n]):
-            n = n + 1
-            while Block.re_excluded.match(lines[n]) is None:
-                membership = Membership.from_inline(version, currency, "OUT", lines[n])
+        if Block.re_leavers.match(raw, pos, end):
+            next_line()
+            while Block.re_excluded.match(raw, pos, end) is None:
+                membership = Membership.from_inline(version, currency, "OUT", raw, pos, end)
                 leavers.append(membership)
-                n = n + 1
+                next_line()
 
-        if Block.re_excluded.match(lines[n]):
-            n = n + 1
-            while Block.re_certifications.match(lines[n]) is None:
-                membership = Block.re_exclusion.match(lines[n]).group(1)
+        if Block.re_excluded.match(raw, pos, end):
+            next_line()
+            while Block.re_certifications.match(raw, pos, end) is None:
+                membership = Block.re_exclusion.match(raw, pos, end).group(1)
                 excluded.append(membership)
-                n = n + 1
+                next_line()
 
-        if Block.re_certifications.match(lines[n]):
-            n = n + 1
-            while Block.re_transactions.match(lines[n]) is None:
+        if Block.re_certifications.match(raw, pos, end):
+            next_line()
+            while Block.re_transactions.match(raw, pos, end) is None:
                 certification = Certification.from_inline(version, currency,
-                                                          prev_hash, lines[n])
+                                                          self.prev_hash, raw, pos, end)
                 certifications.append(certification)
-                n = n + 1
-
-        if Block.re_transactions.match(lines[n]):
-            n = n + 1
-            while not Block.re_signature.match(lines[n]):
-                tx_lines = ""
-                header_data = Transaction.re_header.match(lines[n])
-                version = int(header_data.group(1))
-                issuers_num = int(header_data.group(2))
-                inputs_num = int(header_data.group(3))
-                outputs_num = int(header_data.group(4))
-                has_comment = int(header_data.group(5))
-                tx_max = n+issuers_num*2+inputs_num+outputs_num+has_comment+1
-                for i in range(n, tx_max):
-                    tx_lines += lines[n]
-                    n = n + 1
-                transaction = Transaction.from_compact(currency, tx_lines)
-                transactions.append(transaction)
+                next_line()
 
-        signature = Block.re_signature.match(lines[n]).group(1)
-
-        return cls(version, currency, noonce, number, powmin, time,
-                   mediantime, ud, issuer, prev_hash, prev_issuer,
-                   parameters, members_count, identities, joiners,
-                   actives, leavers, excluded, certifications,
-                   transactions, signature)
+        if Block.re_transactions.match(raw, pos, end):
+            next_line()
+            while not Block.re_signature.match(raw, pos, end):
+                (transaction, end) = Transaction.from_compact_at(currency, raw, pos)
+                transactions.append(transaction)
+                next_line()
+
+        self._identities = identities
+        self._joiners = joiners
+        self._actives = actives
+        self._leavers = leavers
+        self._excluded = excluded
+        self._certifications = certifications
+        self._transactions = transactions
+        self._sections_raw = None
+
+    identities = _section('_identities')
+    joiners = _section('_joiners')
+    actives = _section('_actives')
+    leavers = _section('_leavers')
+    excluded = _section('_excluded')
+    certifications = _section('_certifications')
+    transactions = _section('_transactions')
 
     def raw(self):
-        doc = """Version: {0}
+        if self._signed_raw is not None:
+            # The raw of a parsed block is its signed raw without the signature
+            return self._signed_raw[:self._signed_raw.rfind("\n", 0, len(self._signed_raw) - 1) + 1]
+
+        doc = ["""Version: {0}
 Type: Block
 Currency: {1}
 Nonce: {2}
@@ -250,47 +325,47 @@ MedianTime: {6}
                       self.number,
                       self.powmin,
                       self.time,
-                      self.mediantime)
-        if self.ud:
-            doc += "UniversalDividend: {0}\n".format(self.ud)
+                      self.mediantime)]
+        if self.ud is not None:
+            doc.append("UniversalDividend: {0}\n".format(self.ud))
 
-        doc += "Issuer: {0}\n".format(self.issuer)
+        doc.append("Issuer: {0}\n".format(self.issuer))
 
         if self.number == 0:
             str_params = ":".join(self.parameters)
-            doc += "Parameters: {0}\n".format(str_params)
+            doc.append("Parameters: {0}\n".format(str_params))
         else:
-            doc += "PreviousHash: {0}\n\
-PreviousIssuer: {1}\n".format(self.prev_hash, self.prev_issuer)
+            doc.append("PreviousHash: {0}\n\
+PreviousIssuer: {1}\n".format(self.prev_hash, self.prev_issuer))
 
-        doc += "MembersCount: {0}\n".format(self.members_count)
+        doc.append("MembersCount: {0}\n".format(self.members_count))
 
-        doc += "Identities:\n"
+        doc.append("Identities:\n")
         for identity in self.identities:
-            doc += "{0}\n".format(identity.inline())
+            doc.append("{0}\n".format(identity.inline()))
 
-        doc += "Joiners:\n"
+        doc.append("Joiners:\n")
         for joiner in self.joiners:
-            doc += "{0}\n".format(joiner.inline())
+            doc.append("{0}\n".format(joiner.inline()))
 
-        doc += "Actives:\n"
+        doc.append("Actives:\n")
         for active in self.actives:
-            doc += "{0}\n".format(active.inline())
+            doc.append("{0}\n".format(active.inline()))
 
-        doc += "Leavers:\n"
+        doc.append("Leavers:\n")
         for leaver in self.leavers:
-            doc += "{0]\n".format(leaver.inline())
+            doc.append("{0}\n".format(leaver.inline()))
 
-        doc += "Excluded:\n"
+        doc.append("Excluded:\n")
         for exclude in self.excluded:
-            doc += "{0}\n".format(exclude)
+            doc.append("{0}\n".format(exclude))
 
-        doc += "Certifications:\n"
+        doc.append("Certifications:\n")
         for cert in self.certifications:
-            doc += "{0}\n".format(cert.inline())
+            doc.append("{0}\n".format(cert.inline()))
 
-        doc += "Transactions:\n"
+        doc.append("Transactions:\n")
         for transaction in self.transactions:
-            doc += "{0}\n".format(transaction.compact())
+            doc.append(transaction.compact())
 
-        return doc
+        return "".join(doc)
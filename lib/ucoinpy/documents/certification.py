@@ -4,7 +4,9 @@ Created on 2 déc. 2014
 @author: inso
 '''
 import re
+import sys
 import base64
+import hashlib
 import logging
 
 from . import Document
@@ -14,6 +16,7 @@ class SelfCertification(Document):
     '''
     A document discribing a self certification.
     '''
+    __slots__ = ('pubkey', 'timestamp', 'uid')
 
     re_inline = re.compile("([1-9A-Za-z][^OIl]{42,45}):([A-Za-z0-9+/]+(?:=|==)?):([0-9]+):([^\n]+)\n")
     re_uid = re.compile("UID:([^\n]+)\n")
@@ -24,13 +27,14 @@ class SelfCertification(Document):
             super().__init__(version, currency, [signature])
         else:
             super().__init__(version, currency, [])
-        self.pubkey = pubkey
+        self.pubkey = sys.intern(pubkey)
         self.timestamp = ts
         self.uid = uid
 
     @classmethod
-    def from_inline(cls, version, currency, inline):
-        selfcert_data = SelfCertification.re_inline.match(inline)
+    def from_inline(cls, version, currency, inline, pos=0, endpos=None):
+        endpos = len(inline) if endpos is None else endpos
+        selfcert_data = SelfCertification.re_inline.match(inline, pos, endpos)
         pubkey = selfcert_data.group(1)
         signature = selfcert_data.group(2)
         ts = int(selfcert_data.group(3))
@@ -46,11 +50,20 @@ META:TS:{1}
         return "{0}:{1}:{2}:{3}".format(self.pubkey, self.signatures[0],
                                     self.timestamp, self.uid)
 
+    def __eq__(self, other):
+        return isinstance(other, SelfCertification) \
+            and (self.pubkey, self.uid, self.timestamp) == \
+                (other.pubkey, other.uid, other.timestamp)
+
+    def __hash__(self):
+        return hash((self.pubkey, self.uid, self.timestamp))
+
 
 class Certification(Document):
     '''
     A document describing a certification.
     '''
+    __slots__ = ('pubkey_from', 'pubkey_to', 'blockhash', 'blocknumber')
 
     re_inline = re.compile("([1-9A-Za-z][^OIl]{42,45}):\
 ([1-9A-Za-z][^OIl]{42,45}):([0-9]+):([A-Za-z0-9+/]+(?:=|==)?)\n")
@@ -62,14 +75,15 @@ class Certification(Document):
         Constructor
         '''
         super().__init__(version, currency, [signature])
-        self.pubkey_from = pubkey_from
-        self.pubkey_to = pubkey_to
+        self.pubkey_from = sys.intern(pubkey_from)
+        self.pubkey_to = sys.intern(pubkey_to)
         self.blockhash = blockhash
         self.blocknumber = blocknumber
 
     @classmethod
-    def from_inline(cls, version, currency, blockhash, inline):
-        cert_data = Certification.re_inline.match(inline)
+    def from_inline(cls, version, currency, blockhash, inline, pos=0, endpos=None):
+        endpos = len(inline) if endpos is None else endpos
+        cert_data = Certification.re_inline.match(inline, pos, endpos)
         pubkey_from = cert_data.group(1)
         pubkey_to = cert_data.group(2)
         blocknumber = int(cert_data.group(3))
@@ -77,7 +91,7 @@ class Certification(Document):
             blockhash = "DA39A3EE5E6B4B0D3255BFEF95601890AFD80709"
         signature = cert_data.group(4)
         return cls(version, currency, pubkey_from, pubkey_to,
-                   blockhash, blocknumber, signature)
+                   blocknumber, blockhash, signature)
 
     def raw(self, selfcert):
         return """{0}META:TS:{1}-{2}
@@ -101,10 +115,26 @@ class Certification(Document):
         signed_raw = raw + signed + "\n"
         return signed_raw
 
+    def sha1_with(self, selfcert):
+        '''
+        The hash of the signed raw, which depends on the certified identity.
+        The sha1 property of documents can not be used, since the signed
+        raw of a certification needs its identity.
+        '''
+        return hashlib.sha1(self.signed_raw(selfcert).encode("ascii")).hexdigest().upper()
+
     def inline(self):
         return "{0}:{1}:{2}:{3}".format(self.pubkey_from, self.pubkey_to,
                                         self.blocknumber, self.signatures[0])
 
+    def __eq__(self, other):
+        return isinstance(other, Certification) \
+            and (self.pubkey_from, self.pubkey_to, self.blocknumber) == \
+                (other.pubkey_from, other.pubkey_to, other.blocknumber)
+
+    def __hash__(self):
+        return hash((self.pubkey_from, self.pubkey_to, self.blocknumber))
+
 
 class Revocation(Document):
     '''
@@ -130,3 +160,17 @@ class Revocation(Document):
             signing = base64.b64encode(key.signature(bytes(self.raw(selfcert), 'ascii')))
             self.signatures.append(signing.decode("ascii"))
 
+    def signed_raw(self, selfcert):
+        raw = self.raw(selfcert)
+        signed = "\n".join(self.signatures)
+        signed_raw = raw + signed + "\n"
+        return signed_raw
+
+    def sha1_with(self, selfcert):
+        '''
+        The hash of the signed raw, which depends on the revoked identity.
+        The sha1 property of documents can not be used, since the signed
+        raw of a revocation needs its identity.
+        '''
+        return hashlib.sha1(self.signed_raw(selfcert).encode("ascii")).hexdigest().upper()
+
@@ -7,6 +7,7 @@ from .. import PROTOCOL_VERSION
 from . import Document
 
 import re
+import sys
 
 
 class Membership(Document):
@@ -21,6 +22,8 @@ class Membership(Document):
     UserID: USER_ID
     CertTS: CERTIFICATION_TS
     '''
+    __slots__ = ('issuer', 'block_number', 'block_hash',
+                 'membership_type', 'uid', 'cert_ts')
 
     # PUBLIC_KEY:SIGNATURE:NUMBER:HASH:TIMESTAMP:USER_ID
     re_inline = re.compile("([1-9A-Za-z][^OIl]{42,45}):([A-Za-z0-9+/]+(?:=|==)?):\
@@ -40,7 +43,7 @@ class Membership(Document):
         Constructor
         '''
         super().__init__(version, currency, [signature])
-        self.issuer = issuer
+        self.issuer = sys.intern(issuer)
         self.block_number = block_number
         self.block_hash = block_hash
         self.membership_type = membership_type
@@ -48,8 +51,9 @@ class Membership(Document):
         self.cert_ts = cert_ts
 
     @classmethod
-    def from_inline(cls, version, currency, membership_type, inline):
-        data = Membership.re_inline.match(inline)
+    def from_inline(cls, version, currency, membership_type, inline, pos=0, endpos=None):
+        endpos = len(inline) if endpos is None else endpos
+        data = Membership.re_inline.match(inline, pos, endpos)
         issuer = data.group(1)
         signature = data.group(2)
         block_number = int(data.group(3))
@@ -120,3 +124,14 @@ CertTS: {7}
                                         self.block_hash,
                                         self.cert_ts,
                                         self.uid)
+
+    def __eq__(self, other):
+        return isinstance(other, Membership) \
+            and (self.issuer, self.block_number, self.block_hash,
+                 self.membership_type, self.uid, self.cert_ts) == \
+                (other.issuer, other.block_number, other.block_hash,
+                 other.membership_type, other.uid, other.cert_ts)
+
+    def __hash__(self):
+        return hash((self.issuer, self.block_number, self.block_hash,
+                     self.membership_type, self.uid, self.cert_ts))
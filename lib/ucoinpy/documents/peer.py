@@ -5,6 +5,7 @@ Created on 2 déc. 2014
 '''
 
 import re
+import sys
 
 from ..api.bma import ConnectionHandler
 from . import Document
@@ -24,6 +25,7 @@ class Peer(Document):
     END_POINT_3
     [...]
     """
+    __slots__ = ('pubkey', 'blockid', 'endpoints')
 
     re_type = re.compile("Type: (Peer)")
     re_pubkey = re.compile("PublicKey: ([1-9A-Za-z][^OIl]{42,45})\n")
@@ -34,7 +36,7 @@ class Peer(Document):
                  endpoints, signature):
         super().__init__(version, currency, [signature])
 
-        self.pubkey = pubkey
+        self.pubkey = sys.intern(pubkey)
         self.blockid = blockid
         self.endpoints = endpoints
 
@@ -83,7 +85,6 @@ Endpoints:
         for endpoint in self.endpoints:
             doc += "{0}\n".format(endpoint.inline())
 
-        doc += "{0}\n".format(self.signatures[0])
         return doc
 
 
@@ -91,6 +92,7 @@ class Endpoint():
     """
     Describing endpoints
     """
+    __slots__ = ()
 
     @staticmethod
     def from_inline(inline):
@@ -102,6 +104,7 @@ class Endpoint():
 
 
 class UnknownEndpoint(Endpoint):
+    __slots__ = ('api', 'properties')
 
     def __init__(self, api, properties):
         self.api = api
@@ -119,8 +122,17 @@ class UnknownEndpoint(Endpoint):
             doc += " {0}".format(p)
         return doc
 
+    def __eq__(self, other):
+        return isinstance(other, UnknownEndpoint) \
+            and (self.api, self.properties) == (other.api, other.properties)
+
+    def __hash__(self):
+        return hash((self.api, tuple(self.properties)))
+
 
 class BMAEndpoint(Endpoint):
+    __slots__ = ('server', 'ipv4', 'ipv6', 'port')
+
     re_inline = re.compile('^BASIC_MERKLED_API(?: ([a-z0-9-_.]*(?:.[a-zA-Z])))?(?: ((?:[0-9.]{1,4}){4}))?(?: ((?:[0-9a-f:]{4,5}){4,8}))?(?: ([0-9]+))$')
 
     @classmethod
@@ -152,3 +164,11 @@ class BMAEndpoint(Endpoint):
             return ConnectionHandler(self.ipv4, self.port)
         else:
             return ConnectionHandler(self.ipv6, self.port)
+
+    def __eq__(self, other):
+        return isinstance(other, BMAEndpoint) \
+            and (self.server, self.ipv4, self.ipv6, self.port) == \
+                (other.server, other.ipv4, other.ipv6, other.port)
+
+    def __hash__(self):
+        return hash((self.server, self.ipv4, self.ipv6, self.port))
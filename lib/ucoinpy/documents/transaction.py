@@ -6,6 +6,7 @@ Created on 2 déc. 2014
 
 from . import Document
 import re
+import sys
 import logging
 
 class Transaction(Document):
@@ -63,46 +64,61 @@ SIGNATURE
 
     @classmethod
     def from_compact(cls, currency, compact):
-        lines = compact.splitlines(True)
-        n = 0
+        return cls.from_compact_at(currency, compact, 0)[0]
+
+    @classmethod
+    def from_compact_at(cls, currency, raw, pos):
+        '''
+        Parse a compact transaction starting at an offset of a raw text,
+        with one signature per issuer.
+        The raw is walked line by line by offsets, without copying its lines.
+
+        :param str currency: The currency of the transaction
+        :param str raw: The raw text containing the compact transaction
+        :param int pos: The offset of the transaction header in the raw
+        :return: A (transaction, offset) tuple, with the offset of the \
+        line following the transaction
+        '''
+        end = raw.find("\n", pos) + 1
 
-        header_data = Transaction.re_header.match(lines[n])
+        header_data = Transaction.re_header.match(raw, pos, end)
         version = int(header_data.group(1))
         issuers_num = int(header_data.group(2))
         inputs_num = int(header_data.group(3))
         outputs_num = int(header_data.group(4))
         has_comment = int(header_data.group(5))
-        n = n + 1
+        pos, end = end, raw.find("\n", end) + 1
 
         issuers = []
         inputs = []
         outputs = []
         signatures = []
         for i in range(0, issuers_num):
-            issuer = Transaction.re_pubkey.match(lines[n]).group(1)
+            issuer = Transaction.re_pubkey.match(raw, pos, end).group(1)
             issuers.append(issuer)
-            n = n + 1
+            pos, end = end, raw.find("\n", end) + 1
 
         for i in range(0, inputs_num):
-            input_source = InputSource.from_inline(lines[n])
+            input_source = InputSource.from_inline(raw, pos, end)
             inputs.append(input_source)
-            n = n + 1
+            pos, end = end, raw.find("\n", end) + 1
 
         for i in range(0, outputs_num):
-            output_source = OutputSource.from_inline(lines[n])
+            output_source = OutputSource.from_inline(raw, pos, end)
             outputs.append(output_source)
-            n = n + 1
+            pos, end = end, raw.find("\n", end) + 1
 
         comment = ""
         if has_comment == 1:
-            comment = Transaction.re_compact_comment.match(lines[n]).group(1)
-            n = n + 1
+            comment = Transaction.re_compact_comment.match(raw, pos, end).group(1)
+            pos, end = end, raw.find("\n", end) + 1
 
-        while n < len(lines):
-            signatures.append(Transaction.re_signature.match(lines[n]).group(1))
-            n = n + 1
+        for i in range(0, issuers_num):
+            signatures.append(Transaction.re_signature.match(raw, pos, end).group(1))
+            pos, end = end, raw.find("\n", end) + 1
 
-        return cls(version, currency, issuers, inputs, outputs, comment, signatures)
+        return (cls(version, currency, issuers, inputs, outputs, comment, signatures),
+                pos)
 
     @classmethod
     def from_signed_raw(cls, raw):
@@ -157,59 +173,61 @@ SIGNATURE
                    comment, signatures)
 
     def raw(self):
-        doc = """Version: {0}
+        doc = ["""Version: {0}
 Type: Transaction
 Currency: {1}
 Issuers:
 """.format(self.version,
-                   self.currency)
+                   self.currency)]
 
         for p in self.issuers:
-            doc += "{0}\n".format(p)
+            doc.append("{0}\n".format(p))
 
-        doc += "Inputs:\n"
+        doc.append("Inputs:\n")
         for i in self.inputs:
-            doc += "{0}\n".format(i.inline())
+            doc.append("{0}\n".format(i.inline()))
 
-        doc += "Outputs:\n"
+        doc.append("Outputs:\n")
         for o in self.outputs:
-            doc += "{0}\n".format(o.inline())
+            doc.append("{0}\n".format(o.inline()))
 
-        doc += "Comment: "
-        doc += "{0}\n".format(self.comment)
+        doc.append("Comment: ")
+        doc.append("{0}\n".format(self.comment))
 
-        return doc
+        return "".join(doc)
 
     def compact(self):
         '''
         Return a transaction in its compact format.
         '''
         """TX:VERSION:NB_ISSUERS:NB_INPUTS:NB_OUTPUTS:HAS_COMMENT
-PUBLIC_KEY:INDEX
+PUBLIC_KEY
 ...
-INDEX:SOURCE:FINGERPRINT:AMOUNT
+INDEX:SOURCE:NUMBER:FINGERPRINT:AMOUNT
 ...
 PUBLIC_KEY:AMOUNT
 ...
 COMMENT
+SIGNATURE
+...
 """
-        doc = "TX:{0}:{1}:{2}:{3}:{4}\n".format(self.version,
-                                              len(self.issuers),
-                                              len(self.inputs),
-                                              len(self.outputs),
-                                              '1' if self.comment != "" else '0')
+        doc = ["TX:{0}:{1}:{2}:{3}:{4}\n".format(self.version,
+                                               len(self.issuers),
+                                               len(self.inputs),
+                                               len(self.outputs),
+                                               '1' if self.comment != "" else '0')]
         for pubkey in self.issuers:
-            doc += "{0}\n".format(pubkey)
+            doc.append("{0}\n".format(pubkey))
         for i in self.inputs:
-            doc += "{0}\n".format(i.compact())
+            doc.append("{0}\n".format(i.inline()))
         for o in self.outputs:
-            doc += "{0}\n".format(o.inline())
+            doc.append("{0}\n".format(o.inline()))
         if self.comment != "":
-            doc += "{0}\n".format(self.comment)
+            doc.append("{0}\n".format(self.comment))
         for s in self.signatures:
-            doc += "{0}\n".format(s)
+            doc.append("{0}\n".format(s))
 
-        return doc
+        return "".join(doc)
 
 
 class SimpleTransaction(Transaction):
@@ -233,6 +251,8 @@ class InputSource():
     Compact :
     INDEX:SOURCE:FINGERPRINT:AMOUNT
     '''
+    __slots__ = ('index', 'source', 'number', 'txhash', 'amount')
+
     re_inline = re.compile("([0-9]+):(D|T):([0-9]+):\
 ([0-9a-fA-F]{5,40}):([0-9]+)\n")
     re_compact = re.compile("([0-9]+):(D|T):([0-9a-fA-F]{5,40}):([0-9]+)\n")
@@ -245,8 +265,9 @@ class InputSource():
         self.amount = amount
 
     @classmethod
-    def from_inline(cls, inline):
-        data = InputSource.re_inline.match(inline)
+    def from_inline(cls, inline, pos=0, endpos=None):
+        endpos = len(inline) if endpos is None else endpos
+        data = InputSource.re_inline.match(inline, pos, endpos)
         index = int(data.group(1))
         source = data.group(2)
         number = int(data.group(3))
@@ -276,23 +297,43 @@ class InputSource():
                                         self.txhash,
                                         self.amount)
 
+    def __eq__(self, other):
+        # The index is the position of the input in a transaction,
+        # it does not identify the source
+        return isinstance(other, InputSource) \
+            and (self.source, self.number, self.txhash, self.amount) == \
+                (other.source, other.number, other.txhash, other.amount)
+
+    def __hash__(self):
+        return hash((self.source, self.number, self.txhash, self.amount))
+
 
 class OutputSource():
     '''
     A Transaction OUTPUT
     '''
+    __slots__ = ('pubkey', 'amount')
+
     re_inline = re.compile("([1-9A-Za-z][^OIl]{42,45}):([0-9]+)")
 
     def __init__(self, pubkey, amount):
-        self.pubkey = pubkey
+        self.pubkey = sys.intern(pubkey)
         self.amount = amount
 
     @classmethod
-    def from_inline(cls, inline):
-        data = OutputSource.re_inline.match(inline)
+    def from_inline(cls, inline, pos=0, endpos=None):
+        endpos = len(inline) if endpos is None else endpos
+        data = OutputSource.re_inline.match(inline, pos, endpos)
         pubkey = data.group(1)
         amount = int(data.group(2))
         return cls(pubkey, amount)
 
     def inline(self):
         return "{0}:{1}".format(self.pubkey, self.amount)
+
+    def __eq__(self, other):
+        return isinstance(other, OutputSource) \
+            and (self.pubkey, self.amount) == (other.pubkey, other.amount)
+
+    def __hash__(self):
+        return hash((self.pubkey, self.amount))
@@ -0,0 +1,128 @@
+import base64
+import threading
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+from ..key import Base58Encoder, verify_signature
+from .certification import Certification, Revocation
+
+
+def _verify_signatures(batch):
+    '''
+    Check a batch of signatures, in a worker process.
+
+    :param list batch: (message, signature, vk) tuples of bytes
+    :return: The list of the results
+    '''
+    return [verify_signature(message, signature, vk) for (message, signature, vk) in batch]
+
+
+class SignatureVerifier():
+    '''
+    Check the signatures of many documents, spread by batches
+    on a pool of processes.
+    The documents already verified are remembered by their hash and pubkey,
+    so a document received many times is verified only once.
+    '''
+    # Number of signatures sent to a process at once
+    batch_size = 64
+    # Max number of verified documents remembered
+    max_verified = 100000
+
+    def __init__(self, max_workers=None):
+        '''
+        Init a verifier. The pool of processes is started on first use.
+
+        :param int max_workers: The number of processes, \
+        the number of processors if None
+        '''
+        self.max_workers = max_workers
+        self._pool = None
+        self._verified = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def signature(document, pubkey):
+        '''
+        Get the signature of a document by a pubkey.
+        The signatures of a transaction are ordered as its issuers.
+
+        :param document: A ucoinpy document
+        :param str pubkey: The pubkey of the signer
+        :return: The base64 encoded signature, or None if there is none \
+        or if the pubkey is not an issuer of the document
+        '''
+        if hasattr(document, 'issuers'):
+            try:
+                index = document.issuers.index(pubkey)
+            except ValueError:
+                return None
+        else:
+            index = 0
+        return document.signatures[index] if index < len(document.signatures) else None
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+            return self._pool
+
+    def verify(self, documents):
+        '''
+        Check the signatures of documents.
+        Small batches are checked in the calling thread.
+
+        :param list documents: (document, pubkey) tuples, the documents \
+        being signed on their raw
+        :return: A list of booleans, True if the document is signed by the pubkey
+        :raises TypeError: If a document is a Certification or a Revocation, \
+        their raw depending on the certified identity
+        '''
+        for (document, pubkey) in documents:
+            if isinstance(document, (Certification, Revocation)):
+                raise TypeError("Cannot verify a {0} without its self certification"
+                                .format(type(document).__name__))
+
+        results = [False] * len(documents)
+        keys = []
+        batch = []
+        for (i, (document, pubkey)) in enumerate(documents):
+            key = (document.sha1, pubkey)
+            if key in self._verified:
+                results[i] = True
+                continue
+            signature = SignatureVerifier.signature(document, pubkey)
+            if signature is None:
+                continue
+            try:
+                batch.append((document.raw().encode('ascii'),
+                              base64.b64decode(signature),
+                              Base58Encoder.decode(pubkey)))
+            except ValueError as e:
+                logging.debug("Could not verify {0} : {1}".format(key, str(e)))
+                continue
+            keys.append((i, key))
+
+        if len(batch) <= self.batch_size:
+            verified = _verify_signatures(batch)
+        else:
+            batches = [batch[n:n + self.batch_size] for n in range(0, len(batch), self.batch_size)]
+            verified = [v for r in self._executor().map(_verify_signatures, batches) for v in r]
+
+        with self._lock:
+            if len(self._verified) + len(keys) > self.max_verified:
+                self._verified.clear()
+            for ((i, key), valid) in zip(keys, verified):
+                if valid:
+                    self._verified.add(key)
+                    results[i] = True
+        return results
+
+    def shutdown(self):
+        '''
+        Stop the pool of processes.
+        '''
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False)
+                self._pool = None
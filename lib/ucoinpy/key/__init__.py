@@ -6,8 +6,11 @@ Ucoin public and private keys
 
 import base58
 import base64
+import libnacl
+import libnacl.encode
 from pylibscrypt import scrypt
 from libnacl.sign import Signer as NaclSigningKey
+from libnacl.sign import Verifier as NaclVerifyingKey
 
 
 SEED_LENGTH = 32  # Length of the key
@@ -34,6 +37,51 @@ class SigningKey(NaclSigningKey):
         super().__init__(seed)
         self.pubkey = Base58Encoder.encode(self.vk)
 
+    @classmethod
+    def from_seed(cls, seed):
+        '''
+        Create a signing key from its seed, without running scrypt.
+
+        :param bytes seed: The seed of the key
+        '''
+        key = cls.__new__(cls)
+        NaclSigningKey.__init__(key, seed)
+        key.pubkey = Base58Encoder.encode(key.vk)
+        return key
+
+
+class VerifyingKey(NaclVerifyingKey):
+    def __init__(self, pubkey):
+        super().__init__(libnacl.encode.hex_encode(Base58Encoder.decode(pubkey)))
+        self.pubkey = pubkey
+
+    def verify_signature(self, message, signature):
+        '''
+        Check a detached signature of a message.
+
+        :param message: The signed message
+        :param str signature: The base64 encoded signature
+        :return: True if the signature is valid
+        '''
+        return verify_signature(_ensure_bytes(message),
+                                base64.b64decode(signature), self.vk)
+
+
+def verify_signature(message, signature, vk):
+    '''
+    Check a detached signature of a message.
+
+    :param bytes message: The signed message
+    :param bytes signature: The signature
+    :param bytes vk: The raw verifying key
+    :return: True if the signature is valid
+    '''
+    try:
+        libnacl.crypto_sign_open(signature + message, vk)
+        return True
+    except ValueError:
+        return False
+
 class Base58Encoder(object):
     @staticmethod
     def encode(data):
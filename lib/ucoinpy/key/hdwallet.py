@@ -1,6 +1,13 @@
 '''
 HD Wallet inspired from Bip32 wallets.
 
+The implementation below is disabled : it is Python 2 code, based on
+the secp256k1 curve of the ecdsa package instead of the ed25519 keys
+of ucoin, and nothing derives wallets with it. Child keys derivation
+should be cached (parent public key and fingerprint computed once,
+bounded cache of derived paths, derivation of ranges of siblings)
+when it is ported to ed25519.
+
 @author: inso
 '''
 '''
@@ -15,7 +15,8 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), 'src')))
 print(sys.path)
 includes = ["sip", "re", "json", "logging",
             "hashlib", "os", "urllib",
-            "ucoinpy", "pylibscrypt", "requests"]
+            "ucoinpy", "pylibscrypt", "requests",
+            "asyncio", "aiohttp"]
 excludes = ['.git']
 packages = ["libnacl", "encodings"]
 
@@ -8,7 +8,6 @@ from ucoinpy import PROTOCOL_VERSION
 from ucoinpy.api import bma
 from ucoinpy.documents.certification import SelfCertification, Certification, Revocation
 from ucoinpy.documents.membership import Membership
-from ucoinpy.key import SigningKey
 
 import logging
 import time
@@ -17,6 +16,7 @@ import math
 from PyQt5.QtCore import QObject, pyqtSignal, QCoreApplication, QT_TRANSLATE_NOOP
 
 from .wallet import Wallet
+from .keycache import KeyCache
 from .community import Community
 from .person import Person
 from ..tools.exceptions import ContactAlreadyExists
@@ -111,6 +111,7 @@ class Account(QObject):
     )
 
     loading_progressed = pyqtSignal(int, int)
+    wallets_progressed = pyqtSignal(int, int)
 
     def __init__(self, salt, pubkey, name, communities, wallets, contacts):
         '''
@@ -196,10 +197,10 @@ class Account(QObject):
 
         :param str password: The key password
         :return: True if the generated pubkey is the same as the account
-        .. warnings:: Generates a new temporary SigningKey
+        .. warnings:: Generates a SigningKey, kept in the KeyCache
         '''
-        key = SigningKey(self.salt, password)
-        return (key.pubkey == self.pubkey)
+        key = KeyCache.signing_key(self.pubkey, 0, self.salt, password)
+        return key.pubkey == self.pubkey
 
     def add_contact(self, new_contact):
         same_contact = [contact for contact in self.contacts
@@ -273,13 +274,17 @@ class Account(QObject):
 
         :param int size: The new size of the wallet pool
         :param str password: The password of the account, same for all wallets
+        .. note:: emit the Account pyqtSignal wallets_progressed while \
+        the keys of the new wallets are derived
         '''
         logging.debug("Defining wallet pool size")
         if len(self.wallets) < size:
-            for i in range(len(self.wallets), size):
-                wallet = Wallet.create(i, self.salt, password,
-                                       "Wallet {0}".format(i))
-                self.wallets.append(wallet)
+            def progressing(value, maximum):
+                self.wallets_progressed.emit(value, maximum)
+                QCoreApplication.processEvents()
+
+            self.wallets += Wallet.create_many(list(range(len(self.wallets), size)),
+                                               self.salt, password, progressing)
         else:
             self.wallets = self.wallets[:size]
 
@@ -301,7 +306,7 @@ class Account(QObject):
         selfcert = certified.selfcert(community)
         logging.debug("SelfCertification : {0}".format(selfcert.raw()))
 
-        key = SigningKey(self.salt, password)
+        key = KeyCache.signing_key(self.pubkey, 0, self.salt, password)
         certification.sign(selfcert, [key])
         signed_cert = certification.signed_raw(selfcert)
         logging.debug("Certification : {0}".format(signed_cert))
@@ -325,7 +330,7 @@ class Account(QObject):
 
         selfcert = revoked.selfcert(community)
 
-        key = SigningKey(self.salt, password)
+        key = KeyCache.signing_key(self.pubkey, 0, self.salt, password)
         revocation.sign(selfcert, [key])
 
         logging.debug("Self-Revocation Document : \n{0}".format(revocation.raw(selfcert)))
@@ -399,7 +404,7 @@ class Account(QObject):
                                      int(time.time()),
                                      self.name,
                                      None)
-        key = SigningKey(self.salt, password)
+        key = KeyCache.signing_key(self.pubkey, 0, self.salt, password)
         selfcert.sign([key])
         logging.debug("Key publish : {0}".format(selfcert.signed_raw()))
         community.broadcast(bma.wot.Add, {}, {'pubkey': self.pubkey,
@@ -423,7 +428,7 @@ class Account(QObject):
                                 selfcert.pubkey, blockid['number'],
                                 blockid['hash'], mstype, selfcert.uid,
                                 selfcert.timestamp, None)
-        key = SigningKey(self.salt, password)
+        key = KeyCache.signing_key(self.pubkey, 0, self.salt, password)
         membership.sign([key])
         logging.debug("Membership : {0}".format(membership.signed_raw()))
         community.broadcast(bma.blockchain.Membership, {},
@@ -18,6 +18,7 @@ from PyQt5.QtNetwork import QNetworkAccessManager, QNetworkReply, QNetworkReques
 
 from . import config
 from .account import Account
+from .keycache import KeyCache
 from . import person
 from .watching.monitor import Monitor
 from .. import __version__
@@ -106,6 +107,8 @@ class Application(QObject):
         Current account changes to None if it is deleted.
         '''
         self.accounts.pop(account.name)
+        for community in account.communities:
+            community.close_block_store()
         if self.current_account == account:
             self.current_account = None
         with open(config.parameters['data'], 'w') as outfile:
@@ -129,6 +132,7 @@ class Application(QObject):
             if self.monitor:
                 self.monitor.stop_watching()
             self.save_cache(self.current_account)
+            KeyCache.lock()
         account.loading_progressed.connect(progressing)
         account.refresh_cache()
         self.monitor = Monitor(account)
@@ -197,6 +201,14 @@ class Application(QObject):
                                         account.name, '__cache__',
                                         community.currency + '_network')
 
+            blocks_path = os.path.join(config.parameters['home'],
+                                        account.name, '__cache__',
+                                        community.currency + '_blocks.db')
+
+            if not os.path.exists(os.path.dirname(blocks_path)):
+                os.makedirs(os.path.dirname(blocks_path))
+            community.open_block_store(blocks_path)
+
             if os.path.exists(network_path):
                 with open(network_path, 'r') as json_data:
                     data = json.load(json_data)
@@ -307,7 +319,9 @@ class Application(QObject):
 
     def save_cache(self, account):
         '''
-        Save the cache of an account
+        Save the cache of an account.
+        The block stores of its communities are closed,
+        they are opened again when its cache is loaded.
 
         :param account: The account object to save the cache
         '''
@@ -338,6 +352,8 @@ class Application(QObject):
                 data['version'] = __version__
                 json.dump(data, outfile, indent=4, sort_keys=True)
 
+            community.close_block_store()
+
     def import_account(self, file, name):
         '''
         Import an account from a tar file and open it
@@ -0,0 +1,272 @@
+import sqlite3
+import json
+import logging
+from ucoinpy.documents import binary
+from ucoinpy.documents.block import Block
+from PyQt5.QtCore import QMutex
+
+
+class BlockStore():
+    '''
+    A persistent store of the blocks of a community, in a sqlite database.
+    Blocks are stored with their signed raw, the other fields of their
+    bma json data and their header fields, indexed by number, hash
+    and mediantime.
+    Blocks are flagged as verified when their linkage and signature were
+    checked, only the verified blocks are part of the stored chain.
+    The blocks loaded as documents are kept in a binary encoding,
+    to decode them without parsing their signed raw next time.
+    Once closed, the store is empty and ignores the new blocks, so
+    the threads still holding it do not fail.
+    This class is thread safe.
+    '''
+    _schema = ('''CREATE TABLE IF NOT EXISTS blocks (
+                    number INTEGER PRIMARY KEY,
+                    hash TEXT NOT NULL,
+                    prev_hash TEXT,
+                    mediantime INTEGER NOT NULL,
+                    issuer TEXT NOT NULL,
+                    signed_raw TEXT NOT NULL,
+                    data TEXT NOT NULL,
+                    verified INTEGER NOT NULL DEFAULT 0)''',
+               'CREATE INDEX IF NOT EXISTS blocks_hash ON blocks (hash)',
+               'CREATE INDEX IF NOT EXISTS blocks_mediantime ON blocks (mediantime)',
+               '''CREATE TABLE IF NOT EXISTS documents (
+                    number INTEGER PRIMARY KEY,
+                    hash TEXT NOT NULL,
+                    binary BLOB NOT NULL)''')
+
+    def __init__(self, path=':memory:'):
+        '''
+        Open a block store, creating its database if needed.
+
+        :param str path: The path of the sqlite database file
+        '''
+        self.path = path
+        self._mutex = QMutex()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute('PRAGMA synchronous=NORMAL')
+            for statement in BlockStore._schema:
+                self._connection.execute(statement)
+            columns = [c[1] for c in self._connection.execute('PRAGMA table_info(blocks)')]
+            if 'verified' not in columns:
+                self._connection.execute('''ALTER TABLE blocks
+                                            ADD COLUMN verified INTEGER NOT NULL DEFAULT 0''')
+        logging.debug("Block store opened : {0}".format(path))
+
+    def _query(self, sql, args=()):
+        '''
+        Run a query and fetch all its rows.
+        '''
+        self._mutex.lock()
+        try:
+            if self._connection is None:
+                return []
+            return self._connection.execute(sql, args).fetchall()
+        finally:
+            self._mutex.unlock()
+
+    def _execute(self, sql, args=()):
+        '''
+        Run a statement in a transaction.
+        '''
+        self._execute_many((sql, [args]))
+
+    def _execute_many(self, *statements):
+        '''
+        Run statements in a single transaction, each statement
+        being run for each of its arguments.
+
+        :param statements: (sql, args_list) tuples
+        '''
+        self._mutex.lock()
+        try:
+            if self._connection is None:
+                return
+            with self._connection:
+                for (sql, args_list) in statements:
+                    self._connection.executemany(sql, args_list)
+        finally:
+            self._mutex.unlock()
+
+    def add(self, number, block_hash, data, verified=False):
+        '''
+        Store a block, replacing the block with the same number.
+
+        :param int number: The block number
+        :param str block_hash: The block hash
+        :param dict data: The block as returned by bma.blockchain.Block
+        :param bool verified: True if the block linkage and signature were verified
+        '''
+        self.add_many([(number, block_hash, data)], verified)
+
+    def add_many(self, blocks, verified=False):
+        '''
+        Store blocks in a single transaction,
+        replacing the blocks with the same numbers.
+        A verified block stored again with the same hash stays verified.
+
+        :param list blocks: (number, hash, data) tuples, \
+        with the data as returned by bma.blockchain.Block
+        :param bool verified: True if the blocks linkage and signatures were verified
+        '''
+        rows = []
+        for (number, block_hash, data) in blocks:
+            # The raw is only stored in the signed raw
+            fields = dict((k, v) for (k, v) in data.items() if k != 'raw')
+            rows.append((number, block_hash, data.get('previousHash'),
+                         data['medianTime'], data['issuer'],
+                         "{0}{1}\n".format(data['raw'], data['signature']),
+                         json.dumps(fields), int(verified), number, block_hash))
+        self._execute_many(('''INSERT OR REPLACE INTO blocks
+                               (number, hash, prev_hash, mediantime, issuer,
+                                signed_raw, data, verified)
+                               VALUES (?, ?, ?, ?, ?, ?, ?,
+                                       MAX(?, COALESCE((SELECT verified FROM blocks
+                                                        WHERE number = ? AND hash = ?), 0)))''',
+                            rows),
+                           ('DELETE FROM documents WHERE number = ? AND hash != ?',
+                            [(r[0], r[1]) for r in rows]))
+
+    @staticmethod
+    def _data(row):
+        '''
+        Get the bma json data of a block from its signed raw and data columns.
+        '''
+        (signed_raw, fields) = row
+        data = json.loads(fields)
+        if 'raw' not in data:
+            data['raw'] = signed_raw[:len(signed_raw) - len(data['signature']) - 1]
+        return data
+
+    def get(self, number):
+        '''
+        Get a block by its number.
+
+        :param int number: The block number
+        :return: The block as returned by bma.blockchain.Block, or None
+        '''
+        rows = self._query('SELECT signed_raw, data FROM blocks WHERE number = ?', (number,))
+        return BlockStore._data(rows[0]) if len(rows) > 0 else None
+
+    def get_range(self, from_number, count):
+        '''
+        Get the stored blocks of a range.
+
+        :param int from_number: The number of the first block
+        :param int count: The number of blocks of the range
+        :return: The stored blocks as returned by bma.blockchain.Block, by number
+        '''
+        rows = self._query('''SELECT signed_raw, data FROM blocks
+                              WHERE number >= ? AND number < ?
+                              ORDER BY number''', (from_number, from_number + count))
+        return [BlockStore._data(r) for r in rows]
+
+    def get_documents(self, from_number, count):
+        '''
+        Get the stored blocks of a range as documents.
+        The blocks are decoded from their binary encoding, or parsed
+        from their signed raw and encoded for the next time when
+        they have no encoding yet or when it is corrupt.
+
+        :param int from_number: The number of the first block
+        :param int count: The number of blocks of the range
+        :return: The stored blocks as ucoinpy Block documents, by number
+        '''
+        rows = self._query('''SELECT b.number, b.hash, b.signed_raw, d.binary
+                              FROM blocks b LEFT JOIN documents d
+                              ON d.number = b.number AND d.hash = b.hash
+                              WHERE b.number >= ? AND b.number < ?
+                              ORDER BY b.number''', (from_number, from_number + count))
+        blocks = []
+        encoded = []
+        for (number, block_hash, signed_raw, data) in rows:
+            if data is not None:
+                try:
+                    blocks.append(binary.loads(data))
+                    continue
+                except binary.DecodeError as e:
+                    logging.debug("Block {0} encoding is corrupt : {1}".format(number, str(e)))
+            block = Block.from_signed_raw(signed_raw)
+            encoded.append((number, block_hash, binary.dumps(block)))
+            blocks.append(block)
+        if len(encoded) > 0:
+            self._execute_many(('INSERT OR REPLACE INTO documents (number, hash, binary) VALUES (?, ?, ?)',
+                                encoded))
+        return blocks
+
+    def get_by_hash(self, block_hash):
+        '''
+        Get a block by its hash.
+
+        :param str block_hash: The block hash
+        :return: The block as returned by bma.blockchain.Block, or None
+        '''
+        rows = self._query('SELECT signed_raw, data FROM blocks WHERE hash = ?', (block_hash,))
+        return BlockStore._data(rows[0]) if len(rows) > 0 else None
+
+    def get_by_mediantime(self, start, end):
+        '''
+        Get the blocks with a mediantime in a time range.
+
+        :param int start: The start of the range
+        :param int end: The end of the range, included
+        :return: The blocks as returned by bma.blockchain.Block, by number
+        '''
+        rows = self._query('''SELECT signed_raw, data FROM blocks
+                              WHERE mediantime >= ? AND mediantime <= ?
+                              ORDER BY number''', (start, end))
+        return [BlockStore._data(r) for r in rows]
+
+    def latest(self):
+        '''
+        Get the latest block of the contiguous chain of verified blocks
+        stored from block 0.
+        Blocks stored after a missing or unverified block are ignored.
+
+        :return: A (number, hash) tuple, or None if block 0 is not stored and verified
+        '''
+        rows = self._query('''SELECT b.number, b.hash FROM blocks b
+                              WHERE b.verified AND NOT EXISTS (SELECT 1 FROM blocks n
+                                                               WHERE n.number = b.number + 1
+                                                               AND n.verified)
+                              ORDER BY b.number LIMIT 1''')
+        if len(rows) == 0 \
+                or len(self._query('SELECT 1 FROM blocks WHERE number = 0 AND verified')) == 0:
+            return None
+        return (rows[0][0], rows[0][1])
+
+    def hashes(self, from_number):
+        '''
+        Get the hashes of the stored blocks.
+
+        :param int from_number: The number of the first block
+        :return: A dict of hashes, by block number
+        '''
+        rows = self._query('SELECT number, hash FROM blocks WHERE number >= ?',
+                           (from_number,))
+        return dict(rows)
+
+    def rollback(self, fork_point):
+        '''
+        Remove the blocks after a fork point.
+
+        :param int fork_point: The last block still in the blockchain
+        '''
+        self._execute_many(('DELETE FROM blocks WHERE number > ?', [(fork_point,)]),
+                           ('DELETE FROM documents WHERE number > ?', [(fork_point,)]))
+
+    def close(self):
+        '''
+        Close the database. Closing a closed store does nothing.
+        '''
+        self._mutex.lock()
+        try:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+                logging.debug("Block store closed : {0}".format(self.path))
+        finally:
+            self._mutex.unlock()
@@ -4,30 +4,220 @@ Created on 1 févr. 2014
 @author: inso
 '''
 
-from PyQt5.QtCore import QObject, pyqtSignal
+from PyQt5.QtCore import QObject, pyqtSignal, QMutex, QWaitCondition
 from ucoinpy.api import bma
 from ucoinpy.documents.block import Block
 from ..tools.exceptions import NoPeerAvailable
 from .net.node import Node
+from .blockstore import BlockStore
 from .net.network import Network
 import logging
 import inspect
 import hashlib
 import re
 import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from requests.exceptions import RequestException
 
 
-class Cache():
-    _saved_requests = [str(bma.blockchain.Block), str(bma.blockchain.Parameters)]
+# Max number of hedged requests sent at the same time by all the communities
+_max_hedges = 4
+# Threads sending the hedged requests of all the communities
+_hedging_pool = ThreadPoolExecutor(max_workers=_max_hedges)
+_hedging_slots = threading.BoundedSemaphore(_max_hedges)
+
+
+class Flight():
+    '''
+    A cache request in progress.
+    Every caller asking for the same cache key waits for its result.
+    '''
+    def __init__(self):
+        self.done = False
+        self.result = None
+        self.error = None
+        self.finished = QWaitCondition()
+
 
-    def __init__(self, community):
+class Cache():
+    # Cache policies of the requests
+    # The value is never invalidated
+    IMMUTABLE = 'immutable'
+    # The value is invalidated when a new block is received
+    NEW_BLOCK = 'new_block'
+    # The value is invalidated when a new block matches a predicate
+    BLOCK_CONTENT = 'block_content'
+    # The value is invalidated after a number of seconds
+    TTL = 'ttl'
+    # The value is never cached
+    NEVER = 'never'
+
+    # Policy of each request bma class, as a (policy, parameter) tuple
+    # The parameter is the predicate of BLOCK_CONTENT policies
+    # and the seconds of TTL policies
+    policies = {
+        bma.blockchain.Block: (IMMUTABLE, None),
+        bma.blockchain.Parameters: (IMMUTABLE, None),
+        bma.blockchain.Blocks: (NEVER, None),
+        bma.blockchain.Current: (NEW_BLOCK, None),
+        bma.blockchain.UD: (BLOCK_CONTENT, lambda b: b.ud is not None),
+        bma.blockchain.TX: (BLOCK_CONTENT, lambda b: len(b.transactions) > 0),
+        bma.blockchain.Newcomers: (BLOCK_CONTENT, lambda b: len(b.identities) > 0),
+        bma.blockchain.Certifications: (BLOCK_CONTENT,
+                                        lambda b: len(b.certifications) > 0),
+        bma.blockchain.Joiners: (BLOCK_CONTENT, lambda b: len(b.joiners) > 0),
+        bma.blockchain.Actives: (BLOCK_CONTENT, lambda b: len(b.actives) > 0),
+        bma.blockchain.Leavers: (BLOCK_CONTENT, lambda b: len(b.leavers) > 0),
+        bma.blockchain.Excluded: (BLOCK_CONTENT, lambda b: len(b.excluded) > 0),
+        bma.wot.Members: (BLOCK_CONTENT, lambda b: len(b.joiners) > 0
+                                                   or len(b.leavers) > 0
+                                                   or len(b.excluded) > 0),
+        bma.tx.Sources: (BLOCK_CONTENT, lambda b: b.ud is not None
+                                                  or len(b.transactions) > 0),
+        bma.node.Summary: (TTL, 600),
+        bma.network.Peering: (TTL, 600)
+    }
+    # Policy of the requests missing in the policies table
+    default_policy = (NEW_BLOCK, None)
+    # Max number of new blocks downloaded to check BLOCK_CONTENT policies
+    # If more blocks were received, their values are all invalidated
+    max_inspected_blocks = 20
+    # Default max number of cached requests
+    max_size = 2000
+
+    def __init__(self, community, max_size=None):
         '''
         Init an empty cache
+
+        :param community: The community of this cache
+        :param int max_size: The max number of cached requests. \
+        When it is reached, the least recently used request is evicted.
         '''
         self.latest_block = 0
         self.community = community
-        self.data = {}
+        self.data = OrderedDict()
+        if max_size is not None:
+            self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._stored_at = {}
+        self._blocks_hashes = {}
+        self._flights = {}
+        # The (network block, new blocks, fork point) found by prepare_refresh
+        self._prepared = None
+        self._mutex = QMutex()
+
+    @staticmethod
+    def key(request, req_args, get_args):
+        '''
+        Get the cache key of a request.
+
+        :param request: The request bma class
+        :param req_args: The arguments passed to the request constructor
+        :param get_args: The arguments passed to the requests __get__ method
+        :return: The cache key as a tuple
+        '''
+        return (str(request),
+                tuple(sorted(req_args.items())),
+                tuple(sorted(get_args.items())))
+
+    @classmethod
+    def policy(cls, request_name):
+        '''
+        Get the cache policy of a request.
+
+        :param str request_name: The request bma class name, as in cache keys
+        :return: The (policy, parameter) tuple of the request
+        '''
+        if not hasattr(cls, '_policies_by_name'):
+            cls._policies_by_name = dict((str(r), p) for (r, p)
+                                         in cls.policies.items())
+        return cls._policies_by_name.get(request_name, cls.default_policy)
+
+    @property
+    def stats(self):
+        '''
+        Get the cache statistics.
+
+        :return: A dict with the size, hits, misses and evictions count
+        '''
+        return {'size': len(self.data),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions}
+
+    def _store(self, cache_key, value, stored_at=None):
+        '''
+        Store a value in the cache, evicting the least
+        recently used values if the cache is full.
+        Blocks are stored in the community block store if it is opened.
+        The cache mutex must be locked.
+        '''
+        if cache_key[0] in (str(bma.blockchain.Block), str(bma.blockchain.Current)):
+            block_hash = Community.block_hash("{0}{1}\n".format(value['raw'],
+                                                                value['signature']))
+            self._record_hash(value['number'], block_hash)
+            block_store = self.community.block_store
+            if cache_key[0] == str(bma.blockchain.Block) and block_store is not None:
+                block_store.add(value['number'], block_hash, value)
+                return
+
+        self.data[cache_key] = value
+        self.data.move_to_end(cache_key)
+        self._stored_at[cache_key] = stored_at if stored_at is not None else time.time()
+        while len(self.data) > self.max_size:
+            (evicted, _) = self.data.popitem(last=False)
+            del self._stored_at[evicted]
+            self.evictions += 1
+
+    def _record_hash(self, number, block_hash):
+        '''
+        Record the hash of a block the cache depends on.
+        Only the hashes of the latest blocks are kept.
+        The cache mutex must be locked.
+        '''
+        self._blocks_hashes[number] = block_hash
+        latest = max(self._blocks_hashes)
+        for n in [n for n in self._blocks_hashes
+                  if n < latest - Community.max_fork_depth]:
+            del self._blocks_hashes[n]
+
+    def _expired(self, cache_key):
+        '''
+        Check if the time to live of a value is over.
+        The cache mutex must be locked.
+        '''
+        (policy, ttl) = Cache.policy(cache_key[0])
+        return policy == Cache.TTL \
+            and time.time() - self._stored_at[cache_key] > ttl
+
+    @staticmethod
+    def _load_key(key):
+        '''
+        Get a cache key from its json format.
+        Keys written by older versions, as strings, are not loaded.
+
+        :param list key: The key as a [request, req_args, get_args] list
+        :return: The cache key as a tuple, or None if the key format is unknown
+        '''
+        if not isinstance(key, list) or len(key) != 3 or not isinstance(key[0], str):
+            return None
+        args = []
+        for arg in key[1:]:
+            if not isinstance(arg, list) \
+                    or not all(isinstance(a, list) and len(a) == 2 and isinstance(a[0], str)
+                               for a in arg):
+                return None
+            args.append(tuple((name, value) for (name, value) in arg))
+        cache_key = (key[0], args[0], args[1])
+        try:
+            hash(cache_key)
+        except TypeError:
+            return None
+        return cache_key
 
     def load_from_json(self, data):
         '''
@@ -35,13 +225,23 @@ class Cache():
 
         :param dict data: The cache in json format
         '''
-        self.data = {}
-        for entry in data['cache']:
-            key = entry['key']
-            cache_key = (key[0], key[1], key[2], key[3], key[4])
-            self.data[cache_key] = entry['value']
+        self._mutex.lock()
+        try:
+            self.data = OrderedDict()
+            self._stored_at = {}
+            for entry in data['cache']:
+                cache_key = Cache._load_key(entry['key'])
+                if cache_key is None:
+                    logging.debug("Dropping cache entry {0}".format(entry['key']))
+                    continue
+                self._store(cache_key, entry['value'], entry.get('time', 0))
 
-        self.latest_block = data['latest_block']
+            if 'blocks_hashes' in data:
+                for (number, block_hash) in data['blocks_hashes'].items():
+                    self._record_hash(int(number), block_hash)
+            self.latest_block = data['latest_block']
+        finally:
+            self._mutex.unlock()
 
     def jsonify(self):
         '''
@@ -49,51 +249,219 @@ class Cache():
 
         :return: The cache as a dict in json format
         '''
-        data = {k: self.data[k] for k in self.data.keys()}
-        entries = []
-        for d in data:
-            entries.append({'key': d,
-                            'value': data[d]})
+        self._mutex.lock()
+        try:
+            entries = [{'key': k, 'value': v, 'time': self._stored_at[k]}
+                       for (k, v) in self.data.items()]
+            blocks_hashes = dict((str(n), h) for (n, h)
+                                 in self._blocks_hashes.items())
+        finally:
+            self._mutex.unlock()
         return {'latest_block': self.latest_block,
+                'blocks_hashes': blocks_hashes,
                 'cache': entries}
 
+    def _new_blocks(self, network_block):
+        '''
+        Get the blocks received since the last refresh.
+
+        :param int network_block: The latest block of the network
+        :return: The list of new blocks, or None if they are unknown
+        '''
+        count = network_block - self.latest_block
+        if self.latest_block == 0 or count <= 0 \
+                or count > self.max_inspected_blocks:
+            return None
+        try:
+            return self.community.get_blocks(self.latest_block + 1, count)
+        except (NoPeerAvailable, ValueError, RequestException) as e:
+            logging.debug("Could not get new blocks : {0}".format(str(e)))
+            return None
+
+    def _fork_point(self, blocks):
+        '''
+        Check if the blocks the cache depends on were rolled back.
+
+        :param list blocks: The new blocks, or None if they are unknown
+        :return: None if there is no fork, else the number of the \
+        last known block still in the blockchain
+        '''
+        self._mutex.lock()
+        try:
+            blocks_hashes = dict(self._blocks_hashes)
+        finally:
+            self._mutex.unlock()
+
+        if len(blocks_hashes) == 0:
+            return None
+        if blocks is not None and len(blocks) > 0:
+            # The hashes of the new blocks, and of the block before them
+            new_hashes = dict((b.number, b.sha1) for b in blocks)
+            new_hashes[blocks[0].number - 1] = blocks[0].prev_hash
+            checked = [n for n in blocks_hashes
+                       if min(new_hashes) <= n <= max(new_hashes)]
+            # If the known blocks in this range are the new ones, the blocks
+            # they follow are in the blockchain too. The known blocks after
+            # the new ones are checked on next refresh.
+            if len(checked) > 0 and all(blocks_hashes[n] == new_hashes.get(n)
+                                        for n in checked):
+                return None
+
+        try:
+            return self.community.fork_point(blocks_hashes)
+        except (NoPeerAvailable, ValueError, RequestException) as e:
+            logging.debug("Could not check forks : {0}".format(str(e)))
+            return None
+
+    def prepare_refresh(self):
+        '''
+        Download the blocks received since the last refresh and check
+        if the blocks the cache depends on were rolled back.
+        This sends requests to the network, so it must be called
+        from a watcher thread. The next refresh applies its results.
+        '''
+        network_block = self.community.network.latest_block
+        if self.latest_block == network_block:
+            return
+
+        blocks = self._new_blocks(network_block)
+        fork_point = self._fork_point(blocks)
+        self._mutex.lock()
+        try:
+            self._prepared = (network_block, blocks, fork_point)
+        finally:
+            self._mutex.unlock()
+
     def refresh(self):
         '''
-        Refreshing the cache just clears every last requests which
-        cannot be saved because they can change from one block to another.
+        Refreshing the cache clears the values invalidated by the
+        new blocks, according to the policy of their request.
+        It does not send any request : the new blocks and the fork point
+        are the ones found by the last prepare_refresh.
+        If the new blocks were not downloaded up to the latest block
+        of the network, every value depending on the blocks content is cleared.
+        If the network rolled back some known blocks, these blocks
+        and every value depending on the blockchain state are cleared.
         '''
+        network_block = self.community.network.latest_block
         logging.debug("Refresh : {0}/{1}".format(self.latest_block,
-                                                 self.community.network.latest_block))
-        if self.latest_block < self.community.network.latest_block:
-            self.latest_block = self.community.network.latest_block
-            self.data = {k: self.data[k] for k in self.data.keys()
-                       if k[0] in Cache._saved_requests}
+                                                 network_block))
+        if self.latest_block == network_block:
+            return
+
+        self._mutex.lock()
+        try:
+            (prepared_block, blocks, fork_point) = self._prepared or (None, None, None)
+            self._prepared = None
+            if prepared_block != network_block:
+                blocks = None
+            if fork_point is not None:
+                logging.debug("Fork detected, rolling back to block {0}".format(fork_point))
+
+            if self.latest_block != network_block:
+                self.latest_block = network_block
+                data = OrderedDict()
+                for (k, v) in self.data.items():
+                    (policy, param) = Cache.policy(k[0])
+                    if fork_point is not None:
+                        if policy == Cache.TTL \
+                            or (policy == Cache.IMMUTABLE
+                                and dict(k[1]).get('number', 0) <= fork_point):
+                            data[k] = v
+                        else:
+                            del self._stored_at[k]
+                    elif policy in (Cache.IMMUTABLE, Cache.TTL) \
+                        or (policy == Cache.BLOCK_CONTENT and blocks is not None
+                            and not any(param(b) for b in blocks)):
+                        data[k] = v
+                    else:
+                        del self._stored_at[k]
+                self.data = data
+
+                if fork_point is not None:
+                    if self.community.block_store is not None:
+                        self.community.block_store.rollback(fork_point)
+                    self._blocks_hashes = dict((n, h) for (n, h)
+                                               in self._blocks_hashes.items()
+                                               if n <= fork_point)
+                if blocks is not None:
+                    for b in blocks:
+                        self._record_hash(b.number, b.sha1)
+        finally:
+            self._mutex.unlock()
 
     def request(self, request, req_args={}, get_args={}):
         '''
         Send a cached request to a community.
-        If the request was already sent in current block, return last value get.
+        If the request was already sent and its value is still valid
+        according to the request policy, return last value get.
+        If the same request is already being sent by another thread,
+        wait for its result instead of sending it again.
+        This method is thread safe.
 
         :param request: The request bma class
         :param req_args: The arguments passed to the request constructor
         :param get_args: The arguments passed to the requests __get__ method
         '''
-        cache_key = (str(request),
-                     str(tuple(frozenset(sorted(req_args.keys())))),
-                     str(tuple(frozenset(sorted(req_args.values())))),
-                     str(tuple(frozenset(sorted(get_args.keys())))),
-                     str(tuple(frozenset(sorted(get_args.values())))))
-
-        if cache_key not in self.data.keys():
-            result = self.community.request(request, req_args, get_args,
-                                         cached=False)
-            # For block 0, we should have a different behaviour
-            # Community members and certifications
-            # Should be requested without caching
-            self.data[cache_key] = result
-            return self.data[cache_key]
-        else:
-            return self.data[cache_key]
+        if Cache.policy(str(request))[0] == Cache.NEVER:
+            return self.community.request(request, req_args, get_args,
+                                          cached=False)
+
+        block_store = self.community.block_store
+        if request is bma.blockchain.Block and block_store is not None:
+            block = block_store.get(req_args['number'])
+            if block is not None:
+                self.hits += 1
+                return block
+
+        cache_key = Cache.key(request, req_args, get_args)
+
+        self._mutex.lock()
+        try:
+            if cache_key in self.data and self._expired(cache_key):
+                del self.data[cache_key]
+                del self._stored_at[cache_key]
+
+            if cache_key in self.data:
+                self.hits += 1
+                self.data.move_to_end(cache_key)
+                return self.data[cache_key]
+
+            flight = self._flights.get(cache_key)
+            if flight is not None:
+                self.hits += 1
+                while not flight.done:
+                    flight.finished.wait(self._mutex)
+                if flight.error is not None:
+                    raise flight.error
+                return flight.result
+
+            self.misses += 1
+            flight = Flight()
+            self._flights[cache_key] = flight
+        finally:
+            self._mutex.unlock()
+
+        try:
+            flight.result = self.community.request(request, req_args, get_args,
+                                                   cached=False)
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            self._mutex.lock()
+            try:
+                # For block 0, we should have a different behaviour
+                # Community members and certifications
+                # Should be requested without caching
+                if flight.error is None:
+                    self._store(cache_key, flight.result)
+                flight.done = True
+                del self._flights[cache_key]
+                flight.finished.wakeAll()
+            finally:
+                self._mutex.unlock()
+        return flight.result
 
 
 class Community(QObject):
@@ -103,6 +471,14 @@ class Community(QObject):
     .. warning:: The currency name is supposed to be unique in cutecoin
     but nothing exists in ucoin to assert that a currency name is unique.
     '''
+    # Latency critical requests, sent to a second node if the first one stalls
+    hedged_requests = (bma.blockchain.Current, bma.tx.Sources, bma.wot.Lookup)
+    # Seconds to wait for the first node before sending a hedged request
+    hedge_delay = 0.5
+    # Seconds before the requests of a hedged request time out
+    hedge_timeout = 5
+    # Max depth of the forks detected by the caches
+    max_fork_depth = 100
 
     def __init__(self, currency, network):
         '''
@@ -117,6 +493,9 @@ class Community(QObject):
         super().__init__()
         self.currency = currency
         self._network = network
+        self._block_store = None
+        # The (signature, hash) of the last current block
+        self._current_hash = (None, None)
         self._cache = Cache(self)
         self._cache.refresh()
 
@@ -154,6 +533,35 @@ class Community(QObject):
         '''
         self._network.merge_with_json(json_data)
 
+    def open_block_store(self, path):
+        '''
+        Open the persistent store of the community blocks.
+        Once opened, the blocks requested by number are stored in it
+        instead of the json cache.
+
+        :param str path: The path of the block store database
+        '''
+        self.close_block_store()
+        self._block_store = BlockStore(path)
+
+    def close_block_store(self):
+        '''
+        Close the persistent store of the community blocks, if it is opened.
+        The blocks are then cached in the json cache until it is opened again.
+        '''
+        if self._block_store is not None:
+            self._block_store.close()
+            self._block_store = None
+
+    @property
+    def block_store(self):
+        '''
+        The persistent store of the community blocks.
+
+        :return: The BlockStore, or None if it was not opened
+        '''
+        return self._block_store
+
     def load_cache(self, json_data):
         '''
         Load the community cache.
@@ -350,24 +758,133 @@ class Community(QObject):
         return Block.from_signed_raw("{0}{1}\n".format(data['raw'],
                                                        data['signature']))
 
+    def get_blocks(self, from_number, count):
+        '''
+        Get a range of blocks, from the block store if they are
+        all stored, else downloaded by chunks
+
+        :param int from_number: The number of the first block
+        :param int count: The number of blocks to get
+        :return: A list of ucoinpy Block documents
+        '''
+        if self._block_store is not None:
+            stored = self._block_store.get_documents(from_number, count)
+            if len(stored) == count:
+                return stored
+
+        logging.debug("Requesting blocks {0} to {1}".format(from_number,
+                                                           from_number + count - 1))
+        return self.request(bma.blockchain.Blocks,
+                            req_args={'count': count, 'from_': from_number},
+                            cached=False)
+
+    def get_raw_blocks(self, from_number, count, node=None):
+        '''
+        Get the json data of a range of blocks, without parsing them.
+
+        :param int from_number: The number of the first block
+        :param int count: The number of blocks to get
+        :param node: The node to request, or None to send the request \
+        to the best scored synced nodes
+        :return: The list of the blocks json data
+        '''
+        req_args = {'count': count, 'from_': from_number, 'parsed': False}
+        if node is None:
+            return self.request(bma.blockchain.Blocks, req_args=req_args)
+        return self._node_request(node, bma.blockchain.Blocks, req_args, {})
+
+    @staticmethod
+    def block_hash(signed_raw):
+        '''
+        Compute the hash of a block.
+
+        :param str signed_raw: The block signed raw
+        :return: The block hash, as an uppercase hexadecimal string
+        '''
+        return hashlib.sha1(signed_raw.encode("ascii")).hexdigest().upper()
+
     def current_blockid(self):
         '''
         Get the current block id.
 
-        :return: The current block ID as [NUMBER-HASH] format.
+        :return: The current block ID as [NUMBER-HASH] format, \
+        with the hash of its previous block as 'previous_hash'
         '''
+        previous_hash = None
         try:
             block = self.request(bma.blockchain.Current, cached=False)
-            signed_raw = "{0}{1}\n".format(block['raw'], block['signature'])
-            block_hash = hashlib.sha1(signed_raw.encode("ascii")).hexdigest().upper()
+            # The hash is computed only when the current block changes
+            (signature, block_hash) = self._current_hash
+            if signature != block['signature']:
+                signed_raw = "{0}{1}\n".format(block['raw'], block['signature'])
+                block_hash = Community.block_hash(signed_raw)
+                self._current_hash = (block['signature'], block_hash)
             block_number = block['number']
+            previous_hash = block.get('previousHash')
         except ValueError as e:
             if '404' in str(e):
                 block_number = 0
                 block_hash = "DA39A3EE5E6B4B0D3255BFEF95601890AFD80709"
             else:
                 raise
-        return {'number': block_number, 'hash': block_hash}
+        return {'number': block_number, 'hash': block_hash,
+                'previous_hash': previous_hash}
+
+    def fork_point(self, blocks_hashes, blockid=None):
+        '''
+        Check if known blocks were rolled back by a fork of the network.
+        The blocks are checked by a binary search, since a block
+        can only be in the blockchain if all the previous blocks are.
+
+        :param dict blocks_hashes: The hashes of the known blocks, by block number
+        :param dict blockid: The current block id, as returned by current_blockid
+        :return: None if all the known blocks are in the blockchain. \
+        Else the number of the last known block still in the blockchain, \
+        or 0 if none of them is.
+        '''
+        if len(blocks_hashes) == 0:
+            return None
+        if blockid is None:
+            blockid = self.current_blockid()
+
+        # The current block and its previous block are checked without requests
+        local_hashes = {blockid['number']: blockid['hash']}
+        if blockid.get('previous_hash') is not None:
+            local_hashes[blockid['number'] - 1] = blockid['previous_hash']
+
+        def in_blockchain(number):
+            if number > blockid['number']:
+                return False
+            elif number in local_hashes:
+                return local_hashes[number] == blocks_hashes[number]
+            block = self.request(bma.blockchain.Block,
+                                 req_args={'number': number}, cached=False)
+            signed_raw = "{0}{1}\n".format(block['raw'], block['signature'])
+            return Community.block_hash(signed_raw) == blocks_hashes[number]
+
+        numbers = sorted(blocks_hashes)
+        if in_blockchain(numbers[-1]):
+            return None
+
+        # numbers[valid] is in the blockchain, numbers[invalid] is not
+        valid = -1
+        invalid = len(numbers) - 1
+        # A known block matching the current block or its previous block
+        # is in the blockchain, and so are the blocks before it
+        for n in sorted(local_hashes, reverse=True):
+            if n in blocks_hashes and n < numbers[-1]:
+                if in_blockchain(n):
+                    valid = numbers.index(n)
+                else:
+                    invalid = numbers.index(n)
+                break
+        while invalid - valid > 1:
+            middle = (valid + invalid) // 2
+            if in_blockchain(numbers[middle]):
+                valid = middle
+            else:
+                invalid = middle
+        return numbers[valid] if valid >= 0 else 0
 
     def members_pubkeys(self):
         '''
@@ -380,13 +897,119 @@ class Community(QObject):
 
     def refresh_cache(self):
         '''
-        Start the refresh processing of the cache
+        Check the new blocks and the forks of the network, then refresh
+        the cache. This sends requests to the network, so it must be
+        called from a watcher thread.
         '''
+        self._cache.prepare_refresh()
         self._cache.refresh()
 
+    def _node_request(self, node, request, req_args, get_args, timeout=None):
+        '''
+        Send a request to a node, recording its latency or its failure.
+
+        :param node: The node to request
+        :param request: A ucoinpy bma request class
+        :param req_args: Arguments to pass to the request constructor
+        :param get_args: Arguments to pass to the request __get__ method
+        :param float timeout: Seconds before the request times out, \
+        None for the default timeout of the request
+        :return: The returned data
+        '''
+        try:
+            start = time.time()
+            req = request(node.endpoint.conn_handler(), **req_args)
+            if timeout is not None:
+                req.timeout = timeout
+            data = req.get(**get_args)
+
+            if inspect.isgenerator(data):
+                generated = []
+                for d in data:
+                    generated.append(d)
+                data = generated
+            node.record_latency(time.time() - start)
+            return data
+        except ValueError as e:
+            if '502' in str(e):
+                node.record_failure()
+            raise
+        except RequestException as e:
+            logging.debug("Error : {1} : {0}".format(str(e),
+                                                     str(request)))
+            node.record_failure()
+            raise
+
+    def _hedged_request(self, nodes, request, req_args, get_args):
+        '''
+        Send a request to the first node from the calling thread and, if it
+        did not answer after hedge_delay seconds, to the second node too from
+        the hedging pool. The requests time out after hedge_timeout seconds,
+        so a stalled node only holds a pooled thread for a bounded time.
+        The answer of the first node is returned, or the answer of the second
+        one if the first node failed. When both failed, the request is sent
+        to the next nodes, one after the other.
+        If _max_hedges requests are already hedged, the request is not hedged.
+
+        :param list nodes: The nodes to request, best scored first
+        :return: The returned data
+        '''
+        remaining = list(nodes)
+        primary_done = threading.Event()
+        hedge = None
+
+        def send_hedge(node):
+            try:
+                if primary_done.wait(self.hedge_delay):
+                    return (False, None)
+                logging.debug("Hedging : {0}".format(str(request)))
+                return (True, self._node_request(node, request, req_args, get_args,
+                                                 timeout=self.hedge_timeout))
+            finally:
+                _hedging_slots.release()
+
+        if _hedging_slots.acquire(blocking=False):
+            hedge = _hedging_pool.submit(send_hedge, remaining[1])
+
+        try:
+            return self._node_request(remaining.pop(0), request, req_args, get_args,
+                                      timeout=self.hedge_timeout)
+        except ValueError as e:
+            if '502' not in str(e):
+                raise
+        except RequestException:
+            pass
+        finally:
+            primary_done.set()
+
+        if hedge is not None:
+            try:
+                (sent, data) = hedge.result()
+                if sent:
+                    return data
+            except ValueError as e:
+                if '502' not in str(e):
+                    raise
+                remaining.pop(0)
+            except RequestException:
+                remaining.pop(0)
+
+        for node in remaining:
+            try:
+                return self._node_request(node, request, req_args, get_args,
+                                          timeout=self.hedge_timeout)
+            except ValueError as e:
+                if '502' not in str(e):
+                    raise
+            except RequestException:
+                pass
+        raise NoPeerAvailable(self.currency, len(nodes))
+
     def request(self, request, req_args={}, get_args={}, cached=True):
         '''
         Start a request to the community.
+        Synced nodes are tried from the best scored to the worst one.
+        Requests listed in hedged_requests are hedged between two nodes.
 
         :param request: A ucoinpy bma request class
         :param req_args: Arguments to pass to the request constructor
@@ -396,27 +1019,19 @@ class Community(QObject):
         if cached:
             return self._cache.request(request, req_args, get_args)
         else:
-            nodes = self._network.synced_nodes
+            nodes = sorted(self._network.synced_nodes, key=lambda n: n.score)
+            if request in self.hedged_requests and len(nodes) > 1:
+                return self._hedged_request(nodes, request, req_args, get_args)
+
             for node in nodes:
                 try:
-                    req = request(node.endpoint.conn_handler(), **req_args)
-                    data = req.get(**get_args)
-
-                    if inspect.isgenerator(data):
-                        generated = []
-                        for d in data:
-                            generated.append(d)
-                        return generated
-                    else:
-                        return data
+                    return self._node_request(node, request, req_args, get_args)
                 except ValueError as e:
                     if '502' in str(e):
                         continue
                     else:
                         raise
-                except RequestException as e:
-                    logging.debug("Error : {1} : {0}".format(str(e),
-                                                             str(request)))
+                except RequestException:
                     continue
         raise NoPeerAvailable(self.currency, len(nodes))
 
@@ -0,0 +1,143 @@
+import os
+import time
+import hashlib
+import hmac
+import logging
+import threading
+
+from ucoinpy.key import SigningKey
+
+
+class KeyCache():
+    '''
+    Registry of the signing keys unlocked during the session,
+    by wallet pubkey and wallet id.
+
+    Deriving a signing key from a salt and a password runs scrypt,
+    so the seed of a key is kept in memory for `ttl` seconds after its derivation.
+    Only a salted digest of the password is kept to check it is the same.
+    The cache keeps the seed in a bytearray of its own, wiped when the key
+    expires or when the keys are locked. Every caller gets its own copy of
+    the key, so a copy signing a document is not affected by the wipe.
+    '''
+
+    ttl = 300
+
+    _keys = {}
+    _lock = threading.Lock()
+    _timer = None
+
+    @classmethod
+    def configure(cls, ttl):
+        '''
+        Change the time the keys are kept in memory.
+
+        :param int ttl: Number of seconds before a key expires
+        '''
+        cls.ttl = ttl
+
+    @staticmethod
+    def _digest(nonce, salt, password):
+        return hashlib.sha256(nonce + salt.encode('utf-8') + b'\0'
+                              + password.encode('utf-8')).digest()
+
+    @classmethod
+    def signing_key(cls, pubkey, walletid, salt, password):
+        '''
+        Get a copy of the signing key of a wallet, derived only if it is not
+        in the cache or if the salt or the password changed.
+        A derived key is kept in the cache only if its pubkey is the one
+        of the wallet, so a wrong password leaves the cached key untouched.
+
+        :param str pubkey: The pubkey of the wallet
+        :param int walletid: The wallet number
+        :param str salt: The account salt
+        :param str password: The account password
+        :return: The signing key derived from the salt and the password
+        '''
+        with cls._lock:
+            entry = cls._keys.get((pubkey, walletid))
+            if entry is not None:
+                (nonce, digest, seed, expiration) = entry
+                if time.time() < expiration \
+                        and hmac.compare_digest(digest, cls._digest(nonce, salt, password)):
+                    return SigningKey.from_seed(bytes(seed))
+
+        if walletid == 0:
+            derived = SigningKey(salt, password)
+        else:
+            derived = SigningKey("{0}{1}".format(salt, walletid), password)
+        if derived.pubkey == pubkey:
+            cls.add(pubkey, walletid, salt, password, derived.seed)
+        return derived
+
+    @classmethod
+    def add(cls, pubkey, walletid, salt, password, seed):
+        '''
+        Keep the seed of a signing key derived outside of the cache,
+        for instance in a worker process, replacing the key of the wallet.
+
+        :param str pubkey: The pubkey of the wallet, derived from the seed
+        :param int walletid: The wallet number
+        :param str salt: The account salt
+        :param str password: The account password
+        :param bytes seed: The seed derived from the salt and the password
+        '''
+        seed = bytearray(seed)
+        nonce = os.urandom(16)
+        with cls._lock:
+            previous = cls._keys.get((pubkey, walletid))
+            cls._keys[(pubkey, walletid)] = (nonce, cls._digest(nonce, salt, password),
+                                             seed, time.time() + cls.ttl)
+            if previous is not None:
+                cls._wipe_seed(previous[2])
+            cls._schedule()
+
+    @classmethod
+    def lock(cls, pubkey=None):
+        '''
+        Remove keys from the cache and wipe their seeds.
+        The copies of the keys given back before are not wiped.
+
+        :param str pubkey: The pubkey of the wallet to lock, or None to lock all the wallets
+        '''
+        with cls._lock:
+            for k in [k for k in cls._keys if pubkey is None or k[0] == pubkey]:
+                cls._wipe_seed(cls._keys.pop(k)[2])
+            cls._schedule()
+
+    @classmethod
+    def evict_expired(cls):
+        '''
+        Remove the expired keys from the cache and wipe their seeds.
+        '''
+        with cls._lock:
+            now = time.time()
+            for k in [k for (k, e) in cls._keys.items() if e[3] <= now]:
+                logging.debug("Signing key of wallet {0} expired".format(k[1]))
+                cls._wipe_seed(cls._keys.pop(k)[2])
+            cls._schedule()
+
+    @classmethod
+    def _schedule(cls):
+        '''
+        Schedule the eviction of the next key to expire.
+        Must be called with the lock held.
+        '''
+        if cls._timer is not None:
+            cls._timer.cancel()
+            cls._timer = None
+        if len(cls._keys) > 0:
+            delay = min(e[3] for e in cls._keys.values()) - time.time()
+            cls._timer = threading.Timer(max(delay, 0), cls.evict_expired)
+            cls._timer.daemon = True
+            cls._timer.start()
+
+    @staticmethod
+    def _wipe_seed(seed):
+        '''
+        Overwrite a seed kept by the cache with zeros.
+
+        :param bytearray seed: The seed to wipe
+        '''
+        seed[:] = bytes(len(seed))
@@ -7,6 +7,9 @@ from .node import Node
 
 import logging
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from ucoinpy.documents.peer import BMAEndpoint
 
 from PyQt5.QtCore import pyqtSignal, pyqtSlot, QMutex, QCoreApplication
 from ..watching.watcher import Watcher
@@ -18,9 +21,17 @@ class Network(Watcher):
     given community.
     """
     nodes_changed = pyqtSignal()
+    node_added = pyqtSignal(object)
+    node_removed = pyqtSignal(object)
+    node_changed = pyqtSignal(object)
     new_block_mined = pyqtSignal(int)
     stopped_perpetual_crawling = pyqtSignal()
 
+    # Max number of nodes refreshed at the same time while crawling
+    crawling_workers = 8
+    # Max duration of a crawling round, in seconds
+    crawling_deadline = 60
+
     def __init__(self, currency, nodes):
         '''
         Constructor of a network
@@ -31,12 +42,21 @@ class Network(Watcher):
         super().__init__()
         self._root_nodes = nodes
         self._nodes = []
-        self._mutex = QMutex()
+        # Indexes of the nodes, updated when a node changes
+        self._nodes_by_pubkey = {}
+        self._nodes_by_state = {Node.ONLINE: set(), Node.OFFLINE: set(),
+                                Node.DESYNCED: set(), Node.CORRUPTED: set()}
+        # The (pubkey, state, block) of the nodes when they were indexed
+        self._indexed = {}
+        self._latest_block = 0
+        self._mutex = QMutex(QMutex.Recursive)
         self.currency = currency
         self.nodes = nodes
         self._must_crawl = False
         self._is_perpetual = False
         self._block_found = self.latest_block
+        # Workers fetching the nodes states while crawling
+        self._crawling_pool = ThreadPoolExecutor(max_workers=self.crawling_workers)
 
     @classmethod
     def create(cls, node):
@@ -60,15 +80,19 @@ class Network(Watcher):
         '''
         for data in json_data:
             node = Node.from_json(self.currency, data)
-            if node.pubkey not in [n.pubkey for n in self.nodes]:
+            other_node = self.node(node.pubkey)
+            if other_node is None:
                 self.add_node(node)
                 logging.debug("Loading : {:}".format(data['pubkey']))
-            else:
-                other_node = [n for n in self.nodes if n.pubkey == node.pubkey][0]
-                if other_node.block < node.block:
-                    other_node.block = node.block
-                    other_node.last_change = node.last_change
-                    other_node.state = node.state
+            elif other_node.block < node.block:
+                other_node.block = node.block
+                other_node.last_change = node.last_change
+                other_node.state = node.state
+                self._mutex.lock()
+                try:
+                    self._index(other_node)
+                finally:
+                    self._mutex.unlock()
 
     @classmethod
     def from_json(cls, currency, json_data):
@@ -113,18 +137,31 @@ class Network(Watcher):
         '''
         Get nodes which are in the ONLINE state.
         '''
-        latest = self.latest_block
-        for n in self._nodes:
-            if n.state in (Node.ONLINE, Node.DESYNCED):
-                n.check_sync(latest)
-        return [n for n in self.nodes if n.state == Node.ONLINE]
+        self._mutex.lock()
+        try:
+            return list(self._nodes_by_state[Node.ONLINE])
+        finally:
+            self._mutex.unlock()
 
     @property
     def online_nodes(self):
         '''
-        Get nodes which are in the ONLINE state.
+        Get nodes which are in the ONLINE or DESYNCED state.
         '''
-        return [n for n in self.nodes if n.state in (Node.ONLINE, Node.DESYNCED)]
+        self._mutex.lock()
+        try:
+            return list(self._nodes_by_state[Node.ONLINE] | self._nodes_by_state[Node.DESYNCED])
+        finally:
+            self._mutex.unlock()
+
+    def node(self, pubkey):
+        '''
+        Get a node by its pubkey.
+
+        :param str pubkey: The node pubkey
+        :return: The node, or None if it is not known
+        '''
+        return self._nodes_by_pubkey.get(pubkey)
 
     @property
     def nodes(self):
@@ -152,8 +189,14 @@ class Network(Watcher):
                     n.disconnect()
                 except TypeError:
                     logging.debug("Error disconnecting node {0}".format(n.pubkey[:5]))
+                self.node_removed.emit(n)
 
             self._nodes = []
+            self._nodes_by_pubkey.clear()
+            for bucket in self._nodes_by_state.values():
+                bucket.clear()
+            self._indexed.clear()
+            self._latest_block = 0
             for n in new_nodes:
                 self.add_node(n)
         finally:
@@ -164,15 +207,84 @@ class Network(Watcher):
         '''
         Get latest block known
         '''
-        return max([n.block for n in self.nodes])
+        return self._latest_block
+
+    def _index(self, node):
+        '''
+        Index a node by its pubkey and its state, and update
+        the latest block and the nodes sync states.
+        Must be called with the mutex locked.
+        '''
+        previous = self._indexed.get(node)
+        if previous is not None:
+            (pubkey, state, block) = previous
+            if self._nodes_by_pubkey.get(pubkey) is node:
+                del self._nodes_by_pubkey[pubkey]
+            self._nodes_by_state[state].discard(node)
+        self._indexed[node] = (node.pubkey, node.state, node.block)
+        self._nodes_by_pubkey[node.pubkey] = node
+        self._nodes_by_state[node.state].add(node)
+
+        if node.block > self._latest_block:
+            self._latest_block = node.block
+            self._check_sync(self._nodes_by_state[Node.ONLINE] | self._nodes_by_state[Node.DESYNCED])
+        elif previous is not None and previous[2] == self._latest_block \
+                and node.block < self._latest_block:
+            self._latest_block = max((n.block for n in self._nodes), default=0)
+            self._check_sync(self._nodes_by_state[Node.ONLINE] | self._nodes_by_state[Node.DESYNCED])
+        else:
+            self._check_sync([node])
+
+    def _check_sync(self, nodes):
+        '''
+        Check the sync state of nodes against the latest block,
+        moving them to the bucket of their new state.
+        Must be called with the mutex locked.
+        '''
+        for n in nodes:
+            if n.state in (Node.ONLINE, Node.DESYNCED):
+                state = n.state
+                n.check_sync(self._latest_block)
+                if n.state != state:
+                    self._nodes_by_state[state].discard(n)
+                    self._nodes_by_state[n.state].add(n)
+                    self._indexed[n] = (n.pubkey, n.state, n.block)
 
     def add_node(self, node):
         '''
         Add a node to the network.
         '''
-        self._nodes.append(node)
+        self._mutex.lock()
+        try:
+            self._nodes.append(node)
+            self._index(node)
+        finally:
+            self._mutex.unlock()
         node.changed.connect(self.handle_change)
         logging.debug("{:} connected".format(node.pubkey))
+        self.node_added.emit(node)
+
+    def remove_node(self, node):
+        '''
+        Remove a node from the network.
+        '''
+        self._mutex.lock()
+        try:
+            self._nodes.remove(node)
+            (pubkey, state, block) = self._indexed.pop(node)
+            if self._nodes_by_pubkey.get(pubkey) is node:
+                del self._nodes_by_pubkey[pubkey]
+            self._nodes_by_state[state].discard(node)
+            if block == self._latest_block:
+                self._latest_block = max((n.block for n in self._nodes), default=0)
+                self._check_sync(self._nodes_by_state[Node.ONLINE] | self._nodes_by_state[Node.DESYNCED])
+        finally:
+            self._mutex.unlock()
+        try:
+            node.changed.disconnect(self.handle_change)
+        except TypeError:
+            logging.debug("Error : {0} not connected".format(node.pubkey))
+        self.node_removed.emit(node)
 
     def add_root_node(self, node):
         '''
@@ -222,26 +334,23 @@ class Network(Watcher):
             emit_change = False
             nodes = self.crawling(interval=2)
 
-            new_inlines = [n.endpoint.inline() for n in nodes]
-            last_inlines = [n.endpoint.inline() for n in self.nodes]
-
-            hash_new_nodes = str(tuple(frozenset(sorted(new_inlines))))
-            hash_last_nodes = str(tuple(frozenset(sorted(last_inlines))))
-            if hash_new_nodes != hash_last_nodes:
-                logging.debug("Nodes changed...")
-                self.nodes = nodes
+            # Apply the nodes added, removed or replaced since the last crawling
+            found = {n.pubkey: n for n in nodes}
+            for node in [n for n in self.nodes if found.get(n.pubkey) is not n]:
+                logging.debug("Node removed : {0}".format(node.pubkey[:5]))
+                self.remove_node(node)
                 emit_change = True
-
-            for node in self.nodes:
-                if node.last_change + 3600 < time.time() and \
-                    node.state in (Node.OFFLINE, Node.CORRUPTED):
-                    try:
-                        node.changed.disconnect()
-                    except TypeError:
-                        logging.debug("Error : {0} not connected".format(node.pubkey))
-                    self.nodes.remove(node)
+            for node in nodes:
+                if self.node(node.pubkey) is not node:
+                    logging.debug("Node added : {0}".format(node.pubkey[:5]))
+                    self.add_node(node)
                     emit_change = True
 
+            for node in [n for n in self.nodes if n.last_change + 3600 < time.time()
+                         and n.state in (Node.OFFLINE, Node.CORRUPTED)]:
+                self.remove_node(node)
+                emit_change = True
+
             if emit_change:
                 self.nodes_changed.emit()
             QCoreApplication.processEvents()
@@ -252,8 +361,14 @@ class Network(Watcher):
     def handle_change(self):
         node = self.sender()
         logging.debug("Handle change")
-        if node.state in (Node.ONLINE, Node.DESYNCED):
-            node.check_sync(self.latest_block)
+        self._mutex.lock()
+        try:
+            if node not in self._indexed:
+                return
+            self._index(node)
+        finally:
+            self._mutex.unlock()
+        self.node_changed.emit(node)
         logging.debug("{0} -> {1}".format(self.latest_block, self.latest_block))
         if self._block_found < self.latest_block:
             self._block_found = self.latest_block
@@ -269,22 +384,73 @@ class Network(Watcher):
     def crawling(self, interval=0):
         '''
         One network crawling.
-
-        :param int interval: The interval between two nodes request.
-        '''
+        The peers graph is traversed breadth first from the known nodes,
+        fetching the states of up to crawling_workers nodes at the same time.
+        The states are applied to the nodes in the crawling thread.
+        The known nodes without a BMA endpoint are kept as they are.
+        Each endpoint and each pubkey is visited once per crawling.
+        The crawling stops after crawling_deadline seconds, the known
+        nodes not refreshed yet being kept as they are.
+
+        :param int interval: The pause after the crawling, in seconds
+        :return: The nodes found
+        '''
+        deadline = time.time() + self.crawling_deadline
+        known_nodes = list(self.nodes)
+        known = set(known_nodes)
+        known_pubkeys = set(n.pubkey for n in known_nodes)
+        visited_endpoints = set(n.endpoint for n in known_nodes if n.endpoint is not None)
+        found_pubkeys = set()
+        refreshed = set()
         nodes = []
-        traversed_pubkeys = []
-        knew_pubkeys = [n.pubkey for n in self.nodes]
-        for n in self.nodes:
-            logging.debug(traversed_pubkeys)
-            logging.debug("Peering : next to read : {0} : {1}".format(n.pubkey,
-                          (n.pubkey not in traversed_pubkeys)))
-            if self.continue_crawling():
-                n.peering_traversal(knew_pubkeys, nodes,
-                                    traversed_pubkeys, interval,
-                                    self.continue_crawling)
+        to_refresh = deque(n for n in known_nodes if n.endpoint is not None)
+        # Nodes being refreshed, by future
+        refreshing = {}
+
+        try:
+            while self.continue_crawling() and time.time() < deadline \
+                    and (len(to_refresh) > 0 or len(refreshing) > 0):
+                while len(to_refresh) > 0 and len(refreshing) < self.crawling_workers:
+                    node = to_refresh.popleft()
+                    refreshing[self._crawling_pool.submit(node.fetch_state)] = node
+
+                done, _ = wait(refreshing, timeout=0.1, return_when=FIRST_COMPLETED)
+                for future in done:
+                    node = refreshing.pop(future)
+                    refreshed.add(node)
+                    failed = future.exception() is not None
+                    if failed:
+                        logging.debug("Error refreshing {0} : {1}".format(node.pubkey[:5],
+                                                                         str(future.exception())))
+                    else:
+                        node.apply_state(future.result())
+                        failed = 'error' in future.result()
+                    if node.state == Node.CORRUPTED or node.pubkey in found_pubkeys:
+                        continue
+                    # New nodes must be reachable and not known yet
+                    if node not in known and (failed or node.state == Node.OFFLINE
+                                              or node.pubkey in known_pubkeys):
+                        continue
+
+                    logging.debug("Found : {0} node".format(node.pubkey))
+                    found_pubkeys.add(node.pubkey)
+                    nodes.append(node)
+                    for endpoints in node.neighbours:
+                        endpoint = next((e for e in endpoints if type(e) is BMAEndpoint), None)
+                        if endpoint is not None and endpoint not in visited_endpoints:
+                            visited_endpoints.add(endpoint)
+                            to_refresh.append(Node.from_endpoints(self.currency, endpoints))
                 QCoreApplication.processEvents()
-                time.sleep(interval)
+        finally:
+            for future in refreshing:
+                future.cancel()
+
+        nodes += [n for n in known_nodes
+                  if n not in refreshed and n.pubkey not in found_pubkeys]
+        logging.debug("Nodes found : {0}".format(len(nodes)))
 
-        logging.debug("Nodes found : {0}".format(nodes))
+        end = time.time() + interval
+        while self.continue_crawling() and time.time() < end:
+            QCoreApplication.processEvents()
+            time.sleep(0.1)
         return nodes
@@ -14,6 +14,7 @@ import logging
 import time
 import ctypes
 import sys
+from concurrent.futures import ThreadPoolExecutor
 
 from PyQt5.QtCore import QObject, pyqtSignal
 
@@ -33,6 +34,16 @@ class Node(QObject):
     DESYNCED = 3
     CORRUPTED = 4
 
+    # Weight of the last measured latency in the latency moving average
+    LATENCY_WEIGHT = 0.3
+    # Seconds added to the node score on each failed request
+    FAILURE_PENALTY = 5
+    # Max seconds between two requests of the uid, the software and the neighbours
+    FULL_REFRESH_INTERVAL = 600
+
+    # Requests of the nodes refreshes, sent at the same time
+    _requests_pool = ThreadPoolExecutor(max_workers=16)
+
     changed = pyqtSignal()
 
     def __init__(self, currency, endpoints, uid, pubkey, block,
@@ -49,8 +60,12 @@ class Node(QObject):
         self.block = block
         self._state = state
         self._neighbours = []
+        self._peers_leaves = {}
         self._currency = currency
         self._last_change = last_change
+        self._latency = None
+        self._penalty = 0
+        self._full_refresh = 0
 
     @classmethod
     def from_address(cls, currency, address, port):
@@ -94,6 +109,20 @@ class Node(QObject):
         logging.debug("Node from peer : {:}".format(str(node)))
         return node
 
+    @classmethod
+    def from_endpoints(cls, currency, endpoints):
+        '''
+        Factory method to get a node from its endpoints.
+        Its pubkey and its state are known after its first refresh.
+
+        :param str currency: The node currency
+        :param list endpoints: The node endpoints
+        '''
+        node = cls(currency, endpoints, "", "", 0,
+                   Node.ONLINE, time.time(), "", "")
+        logging.debug("Node from endpoints : {:}".format(str(node)))
+        return node
+
     @classmethod
     def from_json(cls, currency, data):
         endpoints = []
@@ -176,7 +205,10 @@ class Node(QObject):
 
     @property
     def endpoint(self) -> BMAEndpoint:
-        return next((e for e in self._endpoints if type(e) is BMAEndpoint))
+        '''
+        The first BMA endpoint of the node, None if it has none.
+        '''
+        return next((e for e in self._endpoints if type(e) is BMAEndpoint), None)
 
     @property
     def block(self):
@@ -226,6 +258,43 @@ class Node(QObject):
             self.last_change = time.time()
         self._state = new_state
 
+    @property
+    def latency(self):
+        '''
+        The moving average of the node requests latency, in seconds.
+        None if no request was measured yet.
+        '''
+        return self._latency
+
+    @property
+    def score(self):
+        '''
+        The node score, lower is better.
+        It is the node latency plus a penalty for recent failed requests.
+        Nodes which were never measured have the best score, so they get tried.
+        '''
+        latency = self._latency if self._latency is not None else 0
+        return latency + self._penalty
+
+    def record_latency(self, elapsed):
+        '''
+        Record the duration of a successful request to this node.
+
+        :param float elapsed: The request duration in seconds
+        '''
+        if self._latency is None:
+            self._latency = elapsed
+        else:
+            self._latency = Node.LATENCY_WEIGHT * elapsed \
+                            + (1 - Node.LATENCY_WEIGHT) * self._latency
+        self._penalty *= (1 - Node.LATENCY_WEIGHT)
+
+    def record_failure(self):
+        '''
+        Record a failed request to this node.
+        '''
+        self._penalty += Node.FAILURE_PENALTY
+
     def check_sync(self, block):
         #logging.debug("Check sync")
         if self.block < block:
@@ -233,64 +302,95 @@ class Node(QObject):
         else:
             self.state = Node.ONLINE
 
-    def _request_uid(self):
+    def _request_peering(self):
+        start = time.time()
+        informations = bma.network.Peering(self.endpoint.conn_handler()).get()
+        return (informations, time.time() - start)
+
+    def _request_block_number(self):
+        try:
+            block = bma.blockchain.Current(self.endpoint.conn_handler()).get()
+            return block["number"]
+        except ValueError as e:
+            if '404' in str(e):
+                return 0
+            raise
+
+    def _request_neighbours(self):
+        peers_data = bma.network.peering.Peers(self.endpoint.conn_handler()).get(known_leaves=self._peers_leaves)
+        neighbours = []
+        peers_leaves = {}
+        for p in peers_data:
+            peers_leaves[p['hash']] = p
+            peer = Peer.from_signed_raw("{0}{1}\n".format(p['value']['raw'],
+                                                        p['value']['signature']))
+            neighbours.append(peer.endpoints)
+        logging.debug("Found neighbours : {0}".format(len(neighbours)))
+        return (neighbours, peers_leaves)
+
+    def _request_uid(self, pubkey):
         uid = ""
         try:
-            data = bma.wot.Lookup(self.endpoint.conn_handler(), self.pubkey).get()
+            data = bma.wot.Lookup(self.endpoint.conn_handler(), pubkey).get()
             timestamp = 0
             for result in data['results']:
-                if result["pubkey"] == self.pubkey:
-                    uids = result['uids']
-                    for uid in uids:
-                        if uid["meta"]["timestamp"] > timestamp:
-                            timestamp = uid["meta"]["timestamp"]
-                            uid = uid["uid"]
+                if result["pubkey"] == pubkey:
+                    for uid_data in result['uids']:
+                        if uid_data["meta"]["timestamp"] > timestamp:
+                            timestamp = uid_data["meta"]["timestamp"]
+                            uid = uid_data["uid"]
         except ValueError as e:
             if '404' in str(e):
-                logging.debug("Error : node uid not found : {0}".format(self.pubkey))
+                logging.debug("Error : node uid not found : {0}".format(pubkey))
                 uid = ""
         return uid
 
+    def _request_software(self):
+        implementation = bma.node.Summary(self.endpoint.conn_handler()).get()
+        return (implementation["ucoin"]["software"], implementation["ucoin"]["version"])
+
     def refresh_state(self):
-        logging.debug("Refresh state")
-        emit_change = False
-        try:
-            informations = bma.network.Peering(self.endpoint.conn_handler()).get()
-            node_pubkey = informations["pubkey"]
-            try:
-                block = bma.blockchain.Current(self.endpoint.conn_handler()).get()
-                block_number = block["number"]
-            except ValueError as e:
-                if '404' in str(e):
-                    block_number = 0
-
-            peers_data = bma.network.peering.Peers(self.endpoint.conn_handler()).get()
-            neighbours = []
-            for p in peers_data:
-                peer = Peer.from_signed_raw("{0}{1}\n".format(p['value']['raw'],
-                                                            p['value']['signature']))
-                neighbours.append(peer.endpoints)
-            logging.debug("Found neighbours : {0}".format(len(neighbours)))
-
-            node_currency = informations["currency"]
-            node_uid = self._request_uid()
-
-            implementation = bma.node.Summary(self.endpoint.conn_handler()).get()
-            software = implementation["ucoin"]["software"]
-            version = implementation["ucoin"]["version"]
+        '''
+        Refresh the node state, block, pubkey, uid, software and neighbours.
+        '''
+        self.apply_state(self.fetch_state())
 
-            #If the nodes goes back online...
-            if self.state in (Node.OFFLINE, Node.CORRUPTED):
-                self.state = Node.ONLINE
-                logging.debug("Change : new state online")
-                emit_change = True
+    def fetch_state(self):
+        '''
+        Request the node state, block, pubkey, uid, software and neighbours,
+        without changing the node, so that it can run in a worker thread.
+        The peering and the current block are requested at the same time.
+        The uid, the software and the neighbours are requested again, at the
+        same time, only if the pubkey or the block changed, if the node
+        goes back online or after FULL_REFRESH_INTERVAL seconds.
+
+        :return: The state to pass to apply_state
+        :rtype: dict
+        '''
+        logging.debug("Fetch state")
+        try:
+            peering_request = Node._requests_pool.submit(self._request_peering)
+            block_request = Node._requests_pool.submit(self._request_block_number)
+            (informations, latency) = peering_request.result()
+            block_number = block_request.result()
+            state = {'pubkey': informations["pubkey"],
+                     'currency': informations["currency"],
+                     'block': block_number,
+                     'latency': latency}
+
+            if state['pubkey'] != self._pubkey or block_number != self.block \
+                    or self.state in (Node.OFFLINE, Node.CORRUPTED) \
+                    or self._full_refresh + Node.FULL_REFRESH_INTERVAL < time.time():
+                neighbours_request = Node._requests_pool.submit(self._request_neighbours)
+                uid_request = Node._requests_pool.submit(self._request_uid, state['pubkey'])
+                software_request = Node._requests_pool.submit(self._request_software)
+                (state['neighbours'], state['peers_leaves']) = neighbours_request.result()
+                state['uid'] = uid_request.result()
+                (state['software'], state['version']) = software_request.result()
+                state['full_refresh'] = time.time()
+            return state
         except ConnectionError as e:
             logging.debug(str(e))
-
-            if self.state != Node.OFFLINE:
-                self.state = Node.OFFLINE
-                logging.debug("Change : new state offine")
-                emit_change = True
             # Dirty hack to reload resolv.conf on linux
             if 'Connection aborted' in str(e) and 'gaierror' in str(e):
                 logging.debug("Connection Aborted")
@@ -301,96 +401,85 @@ class Node(QObject):
                         res_init(None)
                     except:
                         logging.error('Error calling libc.__res_init')
+            return {'error': e}
         except RequestException as e:
             logging.debug(str(e))
+            return {'error': e}
+
+    def apply_state(self, state):
+        '''
+        Update the node with a state returned by fetch_state.
+        Must be called from the thread owning the node.
+
+        :param dict state: The state returned by fetch_state
+        '''
+        logging.debug("Apply state")
+        emit_change = False
+        if 'error' in state:
             if self.state != Node.OFFLINE:
                 self.state = Node.OFFLINE
                 logging.debug("Change : new state offine")
                 emit_change = True
+        else:
+            self.record_latency(state['latency'])
+            #If the nodes goes back online...
+            if self.state in (Node.OFFLINE, Node.CORRUPTED):
+                self.state = Node.ONLINE
+                logging.debug("Change : new state online")
+                emit_change = True
 
-        # If not is offline, do not refresh last data
-        if self.state != Node.OFFLINE:
             # If not changed its currency, consider it corrupted
-            if node_currency != self._currency:
+            if state['currency'] != self._currency:
                 self.state = Node.CORRUPTED
                 logging.debug("Change : new state corrupted")
                 emit_change = True
             else:
-                if block_number != self.block:
+                if 'full_refresh' in state:
+                    self._peers_leaves = state['peers_leaves']
+                    self._full_refresh = state['full_refresh']
+                neighbours = state.get('neighbours', self._neighbours)
+
+                if state['block'] != self.block:
                     logging.debug("Change : new block {0} -> {1}".format(self.block,
-                                                                         block_number))
-                    self.block = block_number
-                    logging.debug("Changed block {0} -> {1}".format(self.block,
-                                                                         block_number))
+                                                                         state['block']))
+                    self.block = state['block']
                     emit_change = True
 
-                if node_pubkey != self._pubkey:
+                if state['pubkey'] != self._pubkey:
                     logging.debug("Change : new pubkey {0} -> {1}".format(self._pubkey,
-                                                                          node_pubkey))
-                    self._pubkey = node_pubkey
+                                                                          state['pubkey']))
+                    self._pubkey = state['pubkey']
                     emit_change = True
 
-                if node_uid != self._uid:
+                if state.get('uid', self._uid) != self._uid:
                     logging.debug("Change : new uid")
-                    self._uid = node_uid
+                    self._uid = state['uid']
                     emit_change = True
 
-                if software != self._software:
+                if state.get('software', self._software) != self._software:
                     logging.debug("Change : new software")
-                    self._software = software
+                    self._software = state['software']
                     emit_change = True
 
-                if version != self._version:
+                if state.get('version', self._version) != self._version:
                     logging.debug("Change : new version")
-                    self._version = version
+                    self._version = state['version']
                     emit_change = True
 
-                logging.debug(neighbours)
-                new_inlines = [e.inline() for n in neighbours for e in n]
-                last_inlines = [e.inline() for n in self._neighbours for e in n]
-
-                hash_new_neighbours = hash(tuple(frozenset(sorted(new_inlines))))
-                hash_last_neighbours = hash(tuple(frozenset(sorted(last_inlines))))
-                if hash_new_neighbours != hash_last_neighbours:
-                    self._neighbours = neighbours
-                    logging.debug("Change : new neighbours {0} -> {1}".format(last_inlines,
-                                                                              new_inlines))
-                    emit_change = True
+                if neighbours is not self._neighbours:
+                    new_endpoints = frozenset(e for n in neighbours for e in n)
+                    last_endpoints = frozenset(e for n in self._neighbours for e in n)
+                    if new_endpoints != last_endpoints:
+                        self._neighbours = neighbours
+                        logging.debug("Change : new neighbours {0} -> {1}".format(len(last_endpoints),
+                                                                                  len(new_endpoints)))
+                        emit_change = True
 
         if emit_change:
             self.changed.emit()
 
-    def peering_traversal(self, knew_pubkeys, found_nodes,
-                          traversed_pubkeys, interval,
-                          continue_crawling):
-        logging.debug("Read {0} peering".format(self.pubkey))
-        traversed_pubkeys.append(self.pubkey)
-        self.refresh_state()
-
-        if self.pubkey not in [n.pubkey for n in found_nodes]:
-            # if node is corrupted remove it
-            if self.state != Node.CORRUPTED:
-                logging.debug("Found : {0} node".format(self.pubkey))
-                found_nodes.append(self)
-            logging.debug(self.neighbours)
-            for n in self.neighbours:
-                try:
-                    e = next(e for e in n if type(e) is BMAEndpoint)
-                    peering = bma.network.Peering(e.conn_handler()).get()
-                except:
-                    continue
-                peer = Peer.from_signed_raw("{0}{1}\n".format(peering['raw'],
-                                                            peering['signature']))
-                if peer.pubkey not in traversed_pubkeys and \
-                    peer.pubkey not in knew_pubkeys and continue_crawling():
-                    node = Node.from_peer(self._currency, peer)
-                    logging.debug(traversed_pubkeys)
-                    logging.debug("Traversing : next to read : {0} : {1}".format(node.pubkey,
-                                  (node.pubkey not in traversed_pubkeys)))
-                    node.peering_traversal(knew_pubkeys, found_nodes,
-                                        traversed_pubkeys, interval, continue_crawling)
-                    time.sleep(interval)
-
     def __str__(self):
-        return ','.join([str(self.pubkey), str(self.endpoint.server), str(self.endpoint.port), str(self.block),
+        endpoint = self.endpoint
+        return ','.join([str(self.pubkey), str(endpoint.server if endpoint else None),
+                         str(endpoint.port if endpoint else None), str(self.block),
                          str(self.currency), str(self.state), str(self.neighbours)])
@@ -0,0 +1,181 @@
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from ucoinpy.documents.block import Block
+from ucoinpy.documents.verification import SignatureVerifier
+from requests.exceptions import RequestException
+from ..tools.exceptions import NoPeerAvailable
+
+
+class BlockchainSync():
+    '''
+    Replicate the blockchain of a community in its block store.
+    Chunks of blocks are downloaded in parallel, and stored in order once
+    their PreviousHash linkage and their signatures are verified.
+    A chunk is first requested to the best scored nodes of the community,
+    then to each synced node in turn if it failed or was invalid.
+    The synchronization resumes from the last verified block stored.
+    '''
+    # Number of blocks downloaded by request
+    chunk_size = 100
+    # Max number of chunks downloaded at the same time
+    max_workers = 4
+    # Max number of chunks being downloaded or waiting to be stored
+    max_chunks = 8
+    # Verifier of the blocks signatures, shared by the synchronizations
+    verifier = SignatureVerifier()
+
+    def __init__(self, community):
+        '''
+        Init the synchronization of a community blockchain.
+
+        :param community: The community to synchronize
+        '''
+        self.community = community
+        self.exiting = False
+
+    def stop(self):
+        '''
+        Stop the synchronization after the chunks being stored.
+        '''
+        self.exiting = True
+
+    def _download(self, node, from_number, count):
+        '''
+        Download a chunk of blocks.
+
+        :param node: The node to request, or None for the best scored nodes
+        :return: The blocks json data
+        '''
+        return self.community.get_raw_blocks(from_number, count, node)
+
+    def _verify(self, blocks, from_number, count, prev_hash):
+        '''
+        Verify the numbers, the PreviousHash linkage and the signatures of a chunk.
+
+        :param list blocks: The blocks json data
+        :param int from_number: The expected number of the first block
+        :param int count: The expected number of blocks
+        :param str prev_hash: The hash of the block before the chunk
+        :return: The hashes of the blocks, or None if the chunk is invalid
+        '''
+        if len(blocks) != count:
+            return None
+        hashes = []
+        documents = []
+        for (i, data) in enumerate(blocks):
+            try:
+                if data['number'] != from_number + i:
+                    return None
+                if prev_hash is not None and data.get('previousHash') != prev_hash:
+                    return None
+                signed_raw = "{0}{1}\n".format(data['raw'], data['signature'])
+                prev_hash = self.community.block_hash(signed_raw)
+                hashes.append(prev_hash)
+                documents.append((Block.from_signed_raw(signed_raw), data['issuer']))
+            except (AttributeError, ValueError, IndexError, KeyError, TypeError) as e:
+                # The block is malformed
+                logging.debug("Sync : malformed block {0} : {1}".format(from_number + i, str(e)))
+                return None
+
+        if not all(self.verifier.verify(documents)):
+            return None
+        return hashes
+
+    def _rollback_fork(self, block_store, latest):
+        '''
+        Rollback the stored blocks not in the blockchain anymore.
+        '''
+        blocks_hashes = block_store.hashes(latest - self.community.max_fork_depth)
+        fork_point = self.community.fork_point(blocks_hashes)
+        if fork_point is not None:
+            logging.debug("Sync : fork detected, rolling back to block {0}".format(fork_point))
+            block_store.rollback(fork_point)
+
+    def sync(self, progressed=None):
+        '''
+        Download the blocks missing in the block store, up to the
+        latest block of the network.
+
+        :param progressed: Optional callback taking the number of \
+        blocks stored and the number of blocks to store
+        :return: The number of blocks stored
+        '''
+        block_store = self.community.block_store
+        if block_store is None:
+            return 0
+
+        nodes = self.community.network.synced_nodes
+        if len(nodes) == 0:
+            raise NoPeerAvailable(self.community.currency,
+                                   len(self.community.network.nodes))
+
+        latest = block_store.latest()
+        (next_number, prev_hash) = (latest[0] + 1, latest[1]) if latest else (0, None)
+        start = next_number
+        target = self.community.network.latest_block
+        if next_number > target:
+            return 0
+
+        logging.debug("Sync : from {0} to {1}".format(next_number, target))
+        chunks = deque((n, min(self.chunk_size, target + 1 - n))
+                       for n in range(next_number, target + 1, self.chunk_size))
+        # Downloads in progress, as futures of (from, count, attempt)
+        pending = {}
+        downloaded = {}
+        stored = 0
+
+        def submit(pool, from_number, count, attempt):
+            node = None
+            if attempt > 0:
+                node = nodes[(from_number // self.chunk_size + attempt) % len(nodes)]
+            future = pool.submit(self._download, node, from_number, count)
+            pending[future] = (from_number, count, attempt)
+
+        with ThreadPoolExecutor(max_workers=min(len(nodes), self.max_workers)) as pool:
+            try:
+                while not self.exiting and (len(chunks) > 0 or len(pending) > 0):
+                    # The chunks waiting for the first one are counted in the window,
+                    # so a stalled chunk does not let the others pile up
+                    while len(chunks) > 0 \
+                            and len(pending) + len(downloaded) < self.max_chunks:
+                        (from_number, count) = chunks.popleft()
+                        submit(pool, from_number, count, 0)
+
+                    finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        (from_number, count, attempt) = pending.pop(future)
+                        try:
+                            downloaded[from_number] = (count, attempt, future.result())
+                        except (ValueError, RequestException, NoPeerAvailable) as e:
+                            logging.debug("Sync : chunk {0} failed : {1}".format(from_number,
+                                                                                   str(e)))
+                            if attempt + 1 >= len(nodes):
+                                return stored
+                            submit(pool, from_number, count, attempt + 1)
+
+                    # Store the verified chunks following the last stored block
+                    while next_number in downloaded:
+                        (count, attempt, blocks) = downloaded.pop(next_number)
+                        hashes = self._verify(blocks, next_number, count, prev_hash)
+                        if hashes is None:
+                            logging.debug("Sync : invalid chunk {0}".format(next_number))
+                            if attempt + 1 < len(nodes):
+                                submit(pool, next_number, count, attempt + 1)
+                                break
+                            # No node sent a chunk linked to the stored chain, it was forked
+                            if next_number == start and latest is not None:
+                                self._rollback_fork(block_store, latest[0])
+                            return stored
+
+                        block_store.add_many(zip(range(next_number, next_number + count),
+                                                 hashes, blocks), verified=True)
+                        next_number += count
+                        prev_hash = hashes[-1]
+                        stored += count
+                        if progressed:
+                            progressed(stored, target + 1 - start)
+            finally:
+                for future in pending:
+                    future.cancel()
+        return stored
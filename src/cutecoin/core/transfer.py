@@ -129,7 +129,7 @@ class Transfer(object):
         :param int block: The block number checked
         :param int time: The time of the block
         '''
-        if tx.signed_raw() == self.txdoc.signed_raw():
+        if tx.sha1 == self.txdoc.sha1:
             self.state = Transfer.VALIDATED
             self._metadata['block'] = block
             self._metadata['time'] = time
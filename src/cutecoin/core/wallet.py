@@ -11,17 +11,40 @@ from ucoinpy.documents.transaction import InputSource, OutputSource, Transaction
 from ucoinpy.key import SigningKey
 
 from ..tools.exceptions import NotEnoughMoneyError, NoPeerAvailable, PersonNotFoundError
+from .keycache import KeyCache
 from .transfer import Transfer, Received
 from .person import Person
 
 from PyQt5.QtCore import QObject, pyqtSignal
 
 import logging
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+
+def _derive_key(walletid, salt, password):
+    '''
+    Derive the signing key of a wallet. Can be run in a worker process.
+
+    :param int walletid: The wallet number
+    :param str salt: The account salt
+    :param str password: The account password
+    :return: The wallet pubkey and the seed of its signing key
+    :rtype: tuple
+    '''
+    if walletid == 0:
+        key = SigningKey(salt, password)
+    else:
+        key = SigningKey("{0}{1}".format(salt, walletid), password)
+    return (key.pubkey, key.seed)
 
 
 class Cache():
+    # Blocks separated by less than this gap are downloaded in the same range
+    _range_gap = 20
+
     def __init__(self, wallet):
         self._latest_block = 0
+        self._blocks_hashes = {}
         self.wallet = wallet
 
         self._transfers = []
@@ -49,6 +72,9 @@ class Cache():
             self.available_sources.append(InputSource.from_inline(s['inline']))
 
         self.latest_block = data['latest_block']
+        if 'blocks_hashes' in data:
+            self._blocks_hashes = dict((int(n), h) for (n, h)
+                                       in data['blocks_hashes'].items())
 
     def jsonify(self):
         data_transfer = []
@@ -60,7 +86,11 @@ class Cache():
             s.index = 0
             data_sources.append({'inline': "{0}\n".format(s.inline())})
 
+        blocks_hashes = dict((str(n), h) for (n, h)
+                             in self._blocks_hashes.items())
+
         return {'latest_block': self.latest_block,
+                'blocks_hashes': blocks_hashes,
                 'transfers': data_transfer,
                 'sources': data_sources}
 
@@ -113,7 +143,7 @@ class Cache():
             awaiting = [t for t in self._transfers
                         if t.state == Transfer.AWAITING]
             # We check if the transaction correspond to one we sent
-            if tx.signed_raw() not in [t.txdoc.signed_raw() for t in awaiting]:
+            if tx.sha1 not in [t.txdoc.sha1 for t in awaiting]:
                 transfer = Transfer.create_validated(tx,
                                                      metadata.copy())
                 self._transfers.append(transfer)
@@ -131,16 +161,8 @@ class Cache():
             self._transfers.append(received)
 
 
-    def _parse_block(self, community, block_number, received_list):
-        block = community.request(bma.blockchain.Block,
-                                  req_args={'number': block_number})
-        signed_raw = "{0}{1}\n".format(block['raw'],
-                                       block['signature'])
-        try:
-            block_doc = Block.from_signed_raw(signed_raw)
-        except:
-            logging.debug("Error in {0}".format(block_number))
-            raise
+    def _parse_block(self, community, block_doc, received_list):
+        block_number = block_doc.number
         for (txid, tx) in enumerate(block_doc.transactions):
             self._parse_transaction(community, tx, block_number,
                                     block_doc.mediantime, received_list,
@@ -153,8 +175,57 @@ class Cache():
         # sent transactions still waiting for validation
         # have to be considered refused
         for transfer in awaiting:
-            transfer.check_registered(tx, block_number,
-                                      block_doc.mediantime)
+            for tx in block_doc.transactions:
+                transfer.check_registered(tx, block_number,
+                                          block_doc.mediantime)
+
+    def _blocks_ranges(self, numbers):
+        '''
+        Group block numbers in ranges of close blocks, to download
+        them with a minimum of requests.
+
+        :param list numbers: The block numbers, in ascending order
+        :return: A list of (from, count) tuples
+        '''
+        ranges = []
+        for n in numbers:
+            if len(ranges) > 0 and n - (ranges[-1][0] + ranges[-1][1]) < self._range_gap:
+                ranges[-1][1] = n - ranges[-1][0] + 1
+            else:
+                ranges.append([n, 1])
+        return [(r[0], r[1]) for r in ranges]
+
+    def _record_hash(self, community, number, block_hash):
+        '''
+        Record the hash of a block the cache depends on.
+        Only the hashes of the latest blocks are kept.
+        '''
+        self._blocks_hashes[number] = block_hash
+        latest = max(self._blocks_hashes)
+        for n in [n for n in self._blocks_hashes
+                  if n < latest - community.max_fork_depth]:
+            del self._blocks_hashes[n]
+
+    def _rollback(self, fork_point):
+        '''
+        Rollback the transfers validated in blocks after a fork point.
+        Received transfers are removed, they will be parsed again if
+        they are found in the new blocks. Sent transfers are waiting
+        for validation again.
+
+        :param int fork_point: The last block still in the blockchain
+        '''
+        logging.debug("Fork detected, rolling back to block {0}".format(fork_point))
+        for transfer in [t for t in self._transfers
+                         if t.state == Transfer.VALIDATED
+                         and t.metadata['block'] > fork_point]:
+            if isinstance(transfer, Received):
+                self._transfers.remove(transfer)
+            else:
+                transfer.state = Transfer.AWAITING
+        self._blocks_hashes = dict((n, h) for (n, h) in self._blocks_hashes.items()
+                                   if n <= fork_point)
+        self.latest_block = min(self.latest_block, fork_point)
 
     def refresh(self, community, received_list):
         current_block = 0
@@ -162,6 +233,10 @@ class Cache():
             block_data = community.current_blockid()
             current_block = block_data['number']
 
+            fork_point = community.fork_point(self._blocks_hashes, block_data)
+            if fork_point is not None:
+                self._rollback(fork_point)
+
             # Lets look if transactions took too long to be validated
             awaiting = [t for t in self._transfers
                         if t.state == Transfer.AWAITING]
@@ -177,14 +252,21 @@ class Cache():
             logging.debug(parsed_blocks)
             self.wallet.refresh_progressed.emit(self.latest_block, current_block)
 
-            for block_number in parsed_blocks:
-                self._parse_block(community, block_number, received_list)
-                self.wallet.refresh_progressed.emit(current_block - block_number,
-                                                     current_block - self.latest_block)
+            ranges = self._blocks_ranges(sorted(parsed_blocks))
+            for (from_number, count) in reversed(ranges):
+                blocks = community.get_blocks(from_number, count)
+                for block_doc in reversed(blocks):
+                    if block_doc.number not in parsed_blocks:
+                        continue
+                    self._parse_block(community, block_doc, received_list)
+                    self._record_hash(community, block_doc.number, block_doc.sha1)
+                    self.wallet.refresh_progressed.emit(current_block - block_doc.number,
+                                                         current_block - self.latest_block)
 
             if current_block > self.latest_block:
                 self.available_sources = self.wallet.sources(community)
                 self.latest_block = current_block
+                self._record_hash(community, current_block, block_data['hash'])
 
             for transfer in awaiting:
                 transfer.check_refused(current_block)
@@ -225,11 +307,47 @@ class Wallet(QObject):
         :param str password: The account password
         :param str name: The account name
         '''
-        if walletid == 0:
-            key = SigningKey(salt, password)
-        else:
-            key = SigningKey("{0}{1}".format(salt, walletid), password)
-        return cls(walletid, key.pubkey, name)
+        (pubkey, seed) = _derive_key(walletid, salt, password)
+        KeyCache.add(pubkey, walletid, salt, password, seed)
+        return cls(walletid, pubkey, name)
+
+    @classmethod
+    def create_many(cls, walletids, salt, password, progressed=None):
+        '''
+        Factory method to create new wallets, their keys being
+        derived in parallel on a pool of processes.
+        The derived keys are kept in the KeyCache, so the wallets
+        do not derive them again to sign their first documents.
+
+        :param list walletids: The wallets numbers
+        :param str salt: The account salt
+        :param str password: The account password
+        :param progressed: Optional callback taking the number of keys \
+        derived and the number of keys to derive, called regularly while waiting
+        :return: The new wallets, named after their number
+        '''
+        pubkeys = {}
+        if len(walletids) == 1:
+            (pubkey, seed) = _derive_key(walletids[0], salt, password)
+            KeyCache.add(pubkey, walletids[0], salt, password, seed)
+            pubkeys[walletids[0]] = pubkey
+        elif len(walletids) > 1:
+            with ProcessPoolExecutor() as pool:
+                futures = {pool.submit(_derive_key, walletid, salt, password): walletid
+                           for walletid in walletids}
+                pending = set(futures)
+                while len(pending) > 0:
+                    done, pending = wait(pending, timeout=0.1,
+                                         return_when=FIRST_COMPLETED)
+                    for future in done:
+                        walletid = futures[future]
+                        (pubkey, seed) = future.result()
+                        KeyCache.add(pubkey, walletid, salt, password, seed)
+                        pubkeys[walletid] = pubkey
+                    if progressed:
+                        progressed(len(pubkeys), len(walletids))
+        return [cls(walletid, pubkeys[walletid], "Wallet {0}".format(walletid))
+                for walletid in walletids]
 
     @classmethod
     def load(cls, json_data):
@@ -290,14 +408,11 @@ class Wallet(QObject):
         :param salt: The account salt
         :param password: The given password
         :return: True if (salt, password) generates the good public key
-        .. warning:: Generates a new temporary SigningKey from salt and password
+        .. warning:: Generates a SigningKey from salt and password, \
+        kept in the KeyCache
         '''
-        key = None
-        if self.walletid == 0:
-            key = SigningKey(salt, password)
-        else:
-            key = SigningKey("{0}{1}".format(salt, self.walletid), password)
-        return (key.pubkey == self.pubkey)
+        key = KeyCache.signing_key(self.pubkey, self.walletid, salt, password)
+        return key.pubkey == self.pubkey
 
     def relative_value(self, community):
         '''
@@ -337,14 +452,12 @@ class Wallet(QObject):
         cache = self.caches[community.currency]
 
         logging.debug("Available inputs : {0}".format(cache.available_sources))
-        buf_inputs = list(cache.available_sources)
-        for s in cache.available_sources:
+        for (i, s) in enumerate(cache.available_sources):
             value += s.amount
             s.index = 0
             inputs.append(s)
-            buf_inputs.remove(s)
             if value >= amount:
-                return (inputs, buf_inputs)
+                return (inputs, cache.available_sources[i + 1:])
 
         raise NotEnoughMoneyError(value, community.currency,
                                   len(inputs), amount)
@@ -388,12 +501,7 @@ class Wallet(QObject):
         block = community.request(bma.blockchain.Block,
                                   req_args={'number': block_number})
         txid = len(block['transactions'])
-        key = None
-        logging.debug("Key : {0} : {1}".format(salt, password))
-        if self.walletid == 0:
-            key = SigningKey(salt, password)
-        else:
-            key = SigningKey("{0}{1}".format(salt, self.walletid), password)
+        key = KeyCache.signing_key(self.pubkey, self.walletid, salt, password)
         logging.debug("Sender pubkey:{0}".format(key.pubkey))
 
         try:
@@ -7,6 +7,7 @@ Created on 18 mars 2015
 from PyQt5.QtCore import QThread, Qt, QObject
 from .blockchain import BlockchainWatcher
 from .persons import PersonsWatcher
+from .sync import SyncWatcher
 import logging
 
 
@@ -30,6 +31,7 @@ class Monitor(object):
         self._blockchain_watchers = {}
         self._network_watchers = {}
         self._persons_watchers = {}
+        self._sync_watchers = {}
         #Monitor.___dirty_monitors.append(self)
 
     def blockchain_watcher(self, community):
@@ -41,6 +43,9 @@ class Monitor(object):
     def persons_watcher(self, community):
         return self._persons_watchers[community.name]
 
+    def sync_watcher(self, community):
+        return self._sync_watchers[community.name]
+
     def connect_watcher_to_thread(self, watcher):
         thread = QThread()
         watcher.moveToThread(thread)
@@ -59,6 +64,10 @@ class Monitor(object):
             self.connect_watcher_to_thread(bc_watcher)
             self._blockchain_watchers[c.name] = bc_watcher
 
+            sync_watcher = SyncWatcher(c)
+            self.connect_watcher_to_thread(sync_watcher)
+            self._sync_watchers[c.name] = sync_watcher
+
             self.connect_watcher_to_thread(c.network)
             self._network_watchers[c.name] = c.network
 
@@ -85,7 +94,14 @@ class Monitor(object):
             watcher.deleteLater()
             watcher.thread().deleteLater()
 
+        for watcher in self._sync_watchers.values():
+            watcher.stop()
+            self.threads_pool.remove(watcher.thread())
+            watcher.deleteLater()
+            watcher.thread().deleteLater()
+
         self.threads_pool = []
         self._blockchain_watchers = {}
         self._network_watchers = {}
         self._persons_watchers = {}
+        self._sync_watchers = {}
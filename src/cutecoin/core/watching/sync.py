@@ -0,0 +1,40 @@
+import logging
+from requests.exceptions import RequestException
+from ...tools.exceptions import NoPeerAvailable
+from ..sync import BlockchainSync
+from .watcher import Watcher
+from PyQt5.QtCore import pyqtSignal
+
+
+class SyncWatcher(Watcher):
+    '''
+    This will replicate the community blockchain
+    in its local block store.
+    The blocks mined while synchronizing are synchronized before the
+    watcher stops. Its thread is started again by the currency tab
+    on each new block mined.
+    '''
+    sync_progressed = pyqtSignal(int, int)
+
+    def __init__(self, community):
+        super().__init__()
+        self.community = community
+        self._sync = BlockchainSync(community)
+
+    def watch(self):
+        logging.debug("Synchronizing {0}".format(self.community.currency))
+        try:
+            stored = self._sync.sync(self.sync_progressed.emit)
+            while stored > 0 and not self._sync.exiting:
+                logging.debug("Synchronized {0} blocks".format(stored))
+                stored = self._sync.sync(self.sync_progressed.emit)
+        except NoPeerAvailable:
+            pass
+        except (RequestException, ValueError) as e:
+            logging.debug("Synchronization failed : {0}".format(str(e)))
+            self.error.emit("Cannot synchronize the blockchain : {0}".format(str(e)))
+        finally:
+            self.watching_stopped.emit()
+
+    def stop(self):
+        self._sync.stop()
@@ -157,6 +157,7 @@ class CurrencyTabWidget(QWidget, Ui_CurrencyTabWidget):
         self.tab_history.start_progress()
         self.app.monitor.blockchain_watcher(self.community).thread().start()
         self.app.monitor.persons_watcher(self.community).thread().start()
+        self.app.monitor.sync_watcher(self.community).thread().start()
         self.refresh_status()
 
     @pyqtSlot()
@@ -13,7 +13,8 @@ from ..gui.password_asker import PasswordAskerDialog, detect_non_printable
 from ..models.communities import CommunitiesListModel
 from ..tools.exceptions import KeyAlreadyUsed, Error, NoPeerAvailable
 
-from PyQt5.QtWidgets import QDialog, QMessageBox
+from PyQt5.QtWidgets import QDialog, QMessageBox, QProgressDialog
+from PyQt5.QtCore import Qt
 
 
 class Step():
@@ -123,7 +124,18 @@ class StepPageCommunities(Step):
             return
 
         nb_wallets = self.config_dialog.spinbox_wallets.value()
+        progress = QProgressDialog(self.config_dialog.tr("Generating the wallets keys"),
+                                   None, 0, nb_wallets, self.config_dialog)
+        progress.setWindowModality(Qt.WindowModal)
+
+        def progressing(value, maximum):
+            progress.setMaximum(maximum)
+            progress.setValue(value)
+
+        self.config_dialog.account.wallets_progressed.connect(progressing)
         self.config_dialog.account.set_walletpool_size(nb_wallets, password)
+        self.config_dialog.account.wallets_progressed.disconnect(progressing)
+        progress.close()
 
         self.config_dialog.app.add_account(self.config_dialog.account)
         if len(self.config_dialog.app.accounts) == 1:
@@ -187,7 +199,8 @@ class ProcessConfigureAccount(QDialog, Ui_AccountConfigurationDialog):
 
     def action_remove_community(self):
         for index in self.list_communities.selectedIndexes():
-            self.account.communities.pop(index.row())
+            community = self.account.communities.pop(index.row())
+            community.close_block_store()
 
         self.list_communities.setModel(CommunitiesListModel(self.account))
 
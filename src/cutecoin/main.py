@@ -5,6 +5,7 @@ Created on 1 févr. 2014
 """
 import signal
 import sys
+import multiprocessing
 import os
 import logging
 
@@ -13,6 +14,8 @@ from cutecoin.gui.mainwindow import MainWindow
 from cutecoin.core.app import Application
 
 if __name__ == '__main__':
+    # needed by the processes pools of frozen executables
+    multiprocessing.freeze_support()
     # activate ctrl-c interrupt
     signal.signal(signal.SIGINT, signal.SIG_DFL)
 
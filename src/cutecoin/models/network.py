@@ -7,7 +7,8 @@ Created on 5 févr. 2014
 import logging
 from ..tools.exceptions import NoPeerAvailable
 from ..core.net.node import Node
-from PyQt5.QtCore import QAbstractTableModel, Qt, QVariant, QSortFilterProxyModel
+from PyQt5.QtCore import QAbstractTableModel, Qt, QVariant, QSortFilterProxyModel, \
+    QModelIndex, pyqtSlot
 from PyQt5.QtGui import QColor, QFont
 
 
@@ -29,6 +30,9 @@ class NetworkFilterProxyModel(QSortFilterProxyModel):
         """
         left_data = self.sourceModel().data(left, Qt.DisplayRole)
         right_data = self.sourceModel().data(right, Qt.DisplayRole)
+        # Unmeasured latencies are None
+        if left_data is None or right_data is None:
+            return left_data is None and right_data is not None
         return (left_data < right_data)
 
     def headerData(self, section, orientation, role):
@@ -43,7 +47,8 @@ class NetworkFilterProxyModel(QSortFilterProxyModel):
             'is_member': self.tr('Member'),
             'pubkey': self.tr('Pubkey'),
             'software': self.tr('Software'),
-            'version': self.tr('Version')
+            'version': self.tr('Version'),
+            'latency': self.tr('Latency')
         }
         _type = self.sourceModel().headerData(section, orientation, role)
         return header_names[_type]
@@ -63,8 +68,16 @@ class NetworkFilterProxyModel(QSortFilterProxyModel):
             and role == Qt.DisplayRole:
             return source_data[:5]
 
+        if index.column() == source_model.columns_types.index('latency') \
+            and role == Qt.DisplayRole:
+            if source_data is None:
+                return ""
+            return self.tr("{0} ms").format(int(source_data * 1000))
+
         if role == Qt.TextAlignmentRole:
-            if source_index.column() == source_model.columns_types.index('address') or source_index.column() == self.sourceModel().columns_types.index('current_block'):
+            if source_index.column() in (source_model.columns_types.index('address'),
+                                         source_model.columns_types.index('current_block'),
+                                         source_model.columns_types.index('latency')):
                 return Qt.AlignRight | Qt.AlignVCenter
             if source_index.column() == source_model.columns_types.index('is_member'):
                 return Qt.AlignCenter
@@ -100,6 +113,7 @@ class NetworkTableModel(QAbstractTableModel):
             'pubkey',
             'software',
             'version',
+            'latency',
             'is_root'
         )
         self.node_colors = {
@@ -114,10 +128,47 @@ class NetworkTableModel(QAbstractTableModel):
             Node.DESYNCED: self.tr('Unsynchronized'),
             Node.CORRUPTED: self.tr('Corrupted')
         }
+        # The nodes displayed, updated from the network signals
+        self._nodes = list(community.network.nodes)
+        community.network.node_added.connect(self.add_node)
+        community.network.node_removed.connect(self.remove_node)
+        community.network.node_changed.connect(self.change_node)
 
     @property
     def nodes(self):
-        return self.community.network.nodes
+        return self._nodes
+
+    @pyqtSlot(object)
+    def add_node(self, node):
+        '''
+        Append the row of a node added to the network.
+        '''
+        if node not in self._nodes:
+            row = len(self._nodes)
+            self.beginInsertRows(QModelIndex(), row, row)
+            self._nodes.append(node)
+            self.endInsertRows()
+
+    @pyqtSlot(object)
+    def remove_node(self, node):
+        '''
+        Remove the row of a node removed from the network.
+        '''
+        if node in self._nodes:
+            row = self._nodes.index(node)
+            self.beginRemoveRows(QModelIndex(), row, row)
+            self._nodes.pop(row)
+            self.endRemoveRows()
+
+    @pyqtSlot(object)
+    def change_node(self, node):
+        '''
+        Refresh the row of a node which changed.
+        '''
+        if node in self._nodes:
+            row = self._nodes.index(node)
+            self.dataChanged.emit(self.index(row, 0),
+                                  self.index(row, len(self.columns_types) - 1))
 
     def rowCount(self, parent):
         return len(self.nodes)
@@ -155,7 +206,8 @@ class NetworkTableModel(QAbstractTableModel):
         is_root = self.community.network.is_root_node(node)
 
         return (address, port, node.block, node.uid,
-                is_member, node.pubkey, node.software, node.version, is_root)
+                is_member, node.pubkey, node.software, node.version,
+                node.latency, is_root)
 
     def data(self, index, role):
         row = index.row()
@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+import threading
+import time
+from ucoinpy.api import bma
+from cutecoin.core.community import Cache, Community
+
+
+class FakeBlock():
+    def __init__(self, number, sha1, prev_hash, ud=None, transactions=()):
+        self.number = number
+        self.sha1 = sha1
+        self.prev_hash = prev_hash
+        self.ud = ud
+        self.transactions = list(transactions)
+        self.identities = []
+        self.certifications = []
+        self.joiners = []
+        self.actives = []
+        self.leavers = []
+        self.excluded = []
+
+
+class FakeNetwork():
+    def __init__(self):
+        self.latest_block = 0
+
+
+class FakeCommunity():
+    def __init__(self):
+        self.network = FakeNetwork()
+        self.block_store = None
+        self.requests = []
+        self.released = threading.Event()
+        self.released.set()
+        self.error = None
+        self.new_blocks = []
+        self.fork = None
+        self.fork_checks = []
+
+    def request(self, request, req_args={}, get_args={}, cached=True):
+        self.requests.append((request, req_args))
+        self.released.wait()
+        if self.error is not None:
+            raise self.error
+        return {'request': str(request), 'req_args': req_args,
+                'count': len(self.requests)}
+
+    def get_blocks(self, from_number, count):
+        return self.new_blocks
+
+    def fork_point(self, blocks_hashes):
+        self.fork_checks.append(blocks_hashes)
+        return self.fork
+
+
+class CacheFlightTest(unittest.TestCase):
+    def setUp(self):
+        self.community = FakeCommunity()
+        self.cache = Cache(self.community)
+
+    def concurrent_requests(self, nb_threads):
+        '''
+        Send the same request from several threads, the first one
+        being answered only once all the others are waiting for it.
+        '''
+        self.community.released.clear()
+        results = []
+        errors = []
+
+        def send():
+            try:
+                results.append(self.cache.request(bma.wot.Members))
+            except ValueError as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=send) for i in range(nb_threads)]
+        for t in threads:
+            t.start()
+        # Every thread but the one sending the request joins its flight
+        deadline = time.time() + 5
+        while self.cache.hits < nb_threads - 1 and time.time() < deadline:
+            time.sleep(0.01)
+        self.community.released.set()
+        for t in threads:
+            t.join(5)
+        return results, errors
+
+    def test_concurrent_requests_sent_once(self):
+        results, errors = self.concurrent_requests(8)
+        self.assertEqual(len(self.community.requests), 1)
+        self.assertEqual(errors, [])
+        self.assertEqual(len(results), 8)
+        self.assertTrue(all(r is results[0] for r in results))
+        self.assertEqual(self.cache.stats['misses'], 1)
+        self.assertEqual(self.cache.stats['hits'], 7)
+
+    def test_error_shared_and_not_cached(self):
+        self.community.error = ValueError("status code != 200 => 500")
+        results, errors = self.concurrent_requests(4)
+        self.assertEqual(len(self.community.requests), 1)
+        self.assertEqual(results, [])
+        self.assertEqual(len(errors), 4)
+        self.assertEqual(self.cache._flights, {})
+
+        self.community.error = None
+        self.cache.request(bma.wot.Members)
+        self.assertEqual(len(self.community.requests), 2)
+
+    def test_different_requests_not_coalesced(self):
+        self.cache.request(bma.wot.Members)
+        self.cache.request(bma.wot.Lookup, req_args={'search': "inso"})
+        self.cache.request(bma.wot.Lookup, req_args={'search': "cgeek"})
+        self.assertEqual(len(self.community.requests), 3)
+
+
+class CacheEvictionTest(unittest.TestCase):
+    def setUp(self):
+        self.community = FakeCommunity()
+        self.cache = Cache(self.community, max_size=3)
+
+    def lookup(self, search):
+        return self.cache.request(bma.wot.Lookup, req_args={'search': search})
+
+    def cached_searches(self):
+        return [dict(k[1])['search'] for k in self.cache.data]
+
+    def test_least_recently_stored_evicted(self):
+        for search in ("a", "b", "c", "d"):
+            self.lookup(search)
+        self.assertEqual(self.cached_searches(), ["b", "c", "d"])
+        self.assertEqual(self.cache.stats['evictions'], 1)
+        self.assertEqual(len(self.cache._stored_at), 3)
+
+    def test_hit_refreshes_recency(self):
+        for search in ("a", "b", "c"):
+            self.lookup(search)
+        self.lookup("a")
+        self.lookup("d")
+        self.assertEqual(self.cached_searches(), ["c", "a", "d"])
+        self.assertEqual(self.cache.stats['hits'], 1)
+
+    def test_evicted_request_sent_again(self):
+        for search in ("a", "b", "c", "d"):
+            self.lookup(search)
+        self.lookup("a")
+        self.assertEqual(len(self.community.requests), 5)
+        self.assertEqual(self.cached_searches(), ["c", "d", "a"])
+        self.assertEqual(self.cache.stats['evictions'], 2)
+
+    def test_load_from_json_evicts(self):
+        data = {'latest_block': 0,
+                'cache': [{'key': [str(bma.wot.Lookup), [["search", s]], []],
+                           'value': s, 'time': 0}
+                          for s in ("a", "b", "c", "d", "e")]}
+        self.cache.load_from_json(data)
+        self.assertEqual(self.cached_searches(), ["c", "d", "e"])
+
+
+def block_data(number):
+    return {'number': number, 'raw': "Block {0}\n".format(number),
+            'signature': "signature{0}".format(number)}
+
+
+def block_hash(number):
+    data = block_data(number)
+    return Community.block_hash("{0}{1}\n".format(data['raw'], data['signature']))
+
+
+class CachePoliciesTest(unittest.TestCase):
+    def setUp(self):
+        self.community = FakeCommunity()
+        self.cache = Cache(self.community)
+
+    def load(self, entries, latest_block=10):
+        cache = []
+        for (request, req_args, value, stored_at) in entries:
+            key = [str(request), [list(a) for a in req_args.items()], []]
+            cache.append({'key': key, 'value': value, 'time': stored_at})
+        self.cache.load_from_json({'latest_block': latest_block, 'cache': cache})
+
+    def cached_requests(self):
+        return set((k[0], k[1]) for k in self.cache.data)
+
+    def refresh(self, network_block):
+        self.community.network.latest_block = network_block
+        self.cache.prepare_refresh()
+        self.cache.refresh()
+
+    def test_policy(self):
+        self.assertEqual(Cache.policy(str(bma.blockchain.Block)), (Cache.IMMUTABLE, None))
+        self.assertEqual(Cache.policy(str(bma.blockchain.Blocks)), (Cache.NEVER, None))
+        self.assertEqual(Cache.policy(str(bma.blockchain.Current)), (Cache.NEW_BLOCK, None))
+        self.assertEqual(Cache.policy(str(bma.blockchain.UD))[0], Cache.BLOCK_CONTENT)
+        self.assertEqual(Cache.policy(str(bma.node.Summary)), (Cache.TTL, 600))
+        self.assertEqual(Cache.policy(str(bma.wot.Lookup)), Cache.default_policy)
+
+    def test_never(self):
+        self.cache.request(bma.blockchain.Blocks, req_args={'count': 10, 'from_': 0})
+        self.cache.request(bma.blockchain.Blocks, req_args={'count': 10, 'from_': 0})
+        self.assertEqual(len(self.community.requests), 2)
+        self.assertEqual(len(self.cache.data), 0)
+
+    def test_ttl(self):
+        self.load([(bma.node.Summary, {}, "summary", time.time()),
+                   (bma.network.Peering, {}, "peering", time.time() - 601)])
+        self.assertEqual(self.cache.request(bma.node.Summary), "summary")
+        self.assertNotEqual(self.cache.request(bma.network.Peering), "peering")
+        self.assertEqual(len(self.community.requests), 1)
+
+    def test_new_block(self):
+        self.load([(bma.blockchain.Parameters, {}, "parameters", time.time()),
+                   (bma.node.Summary, {}, "summary", time.time()),
+                   (bma.wot.Lookup, {'search': "inso"}, "lookup", time.time()),
+                   (bma.blockchain.UD, {}, "ud", time.time()),
+                   (bma.blockchain.TX, {}, "tx", time.time())])
+        self.community.new_blocks = [FakeBlock(11, "HASH11", "HASH10",
+                                               transactions=["tx"])]
+        self.refresh(11)
+        self.assertEqual(self.cached_requests(),
+                         {(str(bma.blockchain.Parameters), ()),
+                          (str(bma.node.Summary), ()),
+                          (str(bma.blockchain.UD), ())})
+        self.assertEqual(self.cache.latest_block, 11)
+
+    def test_new_blocks_unknown(self):
+        self.load([(bma.blockchain.Parameters, {}, "parameters", time.time()),
+                   (bma.node.Summary, {}, "summary", time.time()),
+                   (bma.blockchain.UD, {}, "ud", time.time())])
+        self.refresh(10 + Cache.max_inspected_blocks + 1)
+        self.assertEqual(self.cached_requests(),
+                         {(str(bma.blockchain.Parameters), ()),
+                          (str(bma.node.Summary), ())})
+
+    def test_refresh_without_prepare(self):
+        self.load([(bma.blockchain.UD, {}, "ud", time.time())])
+        self.community.new_blocks = [FakeBlock(11, "HASH11", "HASH10")]
+        self.community.network.latest_block = 11
+        self.cache.refresh()
+        self.assertEqual(self.cached_requests(), set())
+
+    def test_record_hash(self):
+        for n in range(250):
+            self.cache._record_hash(n, "HASH{0}".format(n))
+        self.assertEqual(min(self.cache._blocks_hashes), 249 - Community.max_fork_depth)
+        self.assertEqual(max(self.cache._blocks_hashes), 249)
+
+    def test_no_fork(self):
+        self.load([(bma.blockchain.Block, {'number': n}, block_data(n), time.time())
+                   for n in (5, 8, 10)])
+        self.community.new_blocks = [FakeBlock(11, "HASH11", block_hash(10))]
+        self.refresh(11)
+        self.assertEqual(self.community.fork_checks, [])
+        self.assertEqual(self.cache._blocks_hashes,
+                         {5: block_hash(5), 8: block_hash(8),
+                          10: block_hash(10), 11: "HASH11"})
+
+    def test_fork_rollback(self):
+        self.load([(bma.blockchain.Block, {'number': n}, block_data(n), time.time())
+                   for n in (5, 8, 10)]
+                  + [(bma.blockchain.Parameters, {}, "parameters", time.time()),
+                     (bma.node.Summary, {}, "summary", time.time()),
+                     (bma.blockchain.UD, {}, "ud", time.time())])
+        self.community.new_blocks = [FakeBlock(11, "HASH11", "FORKED10")]
+        self.community.fork = 8
+        self.refresh(11)
+        self.assertEqual(self.community.fork_checks,
+                         [{5: block_hash(5), 8: block_hash(8), 10: block_hash(10)}])
+        self.assertEqual(self.cached_requests(),
+                         {(str(bma.blockchain.Block), (('number', 5),)),
+                          (str(bma.blockchain.Block), (('number', 8),)),
+                          (str(bma.blockchain.Parameters), ()),
+                          (str(bma.node.Summary), ())})
+        self.assertEqual(self.cache._blocks_hashes,
+                         {5: block_hash(5), 8: block_hash(8), 11: "HASH11"})
@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+import time
+from unittest.mock import patch
+from ucoinpy.documents.peer import BMAEndpoint
+from cutecoin.core.net.node import Node
+from cutecoin.core.net.network import Network
+
+
+def make_node(port, block, state=Node.ONLINE, pubkey=None):
+    endpoints = [BMAEndpoint(None, "127.0.0.1", None, port)]
+    return Node("meta_brouzouf", endpoints, "", pubkey or "PUBKEY{0}".format(port),
+                block, state, time.time(), "", "")
+
+
+class NetworkIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.nodes = [make_node(8001, 10), make_node(8002, 10), make_node(8003, 8),
+                      make_node(8004, 0, Node.OFFLINE)]
+        self.network = Network("meta_brouzouf", list(self.nodes))
+
+    def assert_consistent(self):
+        nodes = self.network.nodes
+        self.assertEqual(self.network._nodes_by_pubkey, dict((n.pubkey, n) for n in nodes))
+        for (state, bucket) in self.network._nodes_by_state.items():
+            self.assertEqual(bucket, set(n for n in nodes if n.state == state))
+        self.assertEqual(set(self.network._indexed), set(nodes))
+        self.assertEqual(self.network.latest_block, max((n.block for n in nodes), default=0))
+        for n in nodes:
+            if n.state == Node.ONLINE:
+                self.assertEqual(n.block, self.network.latest_block)
+            elif n.state == Node.DESYNCED:
+                self.assertLess(n.block, self.network.latest_block)
+
+    def change(self, node, block=None, state=None, pubkey=None):
+        '''
+        Change a node as apply_state does, and index it
+        as the network does when the node emits its change.
+        '''
+        if block is not None:
+            node.block = block
+        if state is not None:
+            node.state = state
+        if pubkey is not None:
+            node._pubkey = pubkey
+        self.network._index(node)
+
+    def test_add_nodes(self):
+        self.assert_consistent()
+        self.assertEqual(self.network.latest_block, 10)
+        self.assertEqual(self.nodes[2].state, Node.DESYNCED)
+        self.assertEqual(set(self.network.synced_nodes), set(self.nodes[:2]))
+        self.assertEqual(set(self.network.online_nodes), set(self.nodes[:3]))
+        self.assertIs(self.network.node("PUBKEY8003"), self.nodes[2])
+
+    def test_add_node_with_new_block(self):
+        node = make_node(8005, 12)
+        self.network.add_node(node)
+        self.assert_consistent()
+        self.assertEqual(self.network.synced_nodes, [node])
+
+    def test_remove_node(self):
+        self.network.remove_node(self.nodes[2])
+        self.assert_consistent()
+        self.assertIsNone(self.network.node("PUBKEY8003"))
+
+    def test_remove_node_with_latest_block(self):
+        node = make_node(8005, 12)
+        self.network.add_node(node)
+        self.network.remove_node(node)
+        self.assert_consistent()
+        self.assertEqual(self.network.latest_block, 10)
+        self.assertEqual(set(self.network.synced_nodes), set(self.nodes[:2]))
+
+    def test_new_block(self):
+        self.change(self.nodes[2], block=11)
+        self.assert_consistent()
+        self.assertEqual(self.network.synced_nodes, [self.nodes[2]])
+
+    def test_latest_node_rolled_back(self):
+        self.change(self.nodes[0], block=12)
+        self.change(self.nodes[0], block=10)
+        self.assert_consistent()
+        self.assertEqual(set(self.network.synced_nodes), set(self.nodes[:2]))
+
+    def test_state_changed(self):
+        self.change(self.nodes[0], state=Node.OFFLINE)
+        self.assert_consistent()
+        self.change(self.nodes[3], state=Node.ONLINE, block=10)
+        self.assert_consistent()
+        self.change(self.nodes[1], state=Node.CORRUPTED)
+        self.assert_consistent()
+        self.assertEqual(self.network.synced_nodes, [self.nodes[3]])
+
+    def test_pubkey_changed(self):
+        self.change(self.nodes[0], pubkey="NEWPUBKEY")
+        self.assert_consistent()
+        self.assertIsNone(self.network.node("PUBKEY8001"))
+        self.assertIs(self.network.node("NEWPUBKEY"), self.nodes[0])
+
+    def test_set_nodes(self):
+        nodes = [make_node(8005, 3), make_node(8006, 2)]
+        self.network.nodes = nodes
+        self.assert_consistent()
+        self.assertEqual(self.network.latest_block, 3)
+        self.assertEqual(self.network.synced_nodes, [nodes[0]])
+
+
+class NetworkDeltaTest(unittest.TestCase):
+    def setUp(self):
+        self.nodes = [make_node(8001, 10), make_node(8002, 10), make_node(8003, 10)]
+        self.network = Network("meta_brouzouf", list(self.nodes))
+        self.added = []
+        self.removed = []
+        self.changes = []
+        self.network.node_added.connect(self.added.append)
+        self.network.node_removed.connect(self.removed.append)
+        self.network.nodes_changed.connect(lambda: self.changes.append(True))
+
+    def crawl(self, *crawlings):
+        '''
+        Run the perpetual crawling, each crawling finding the next nodes list.
+        '''
+        crawlings = list(crawlings)
+
+        def crawling(interval=0):
+            nodes = crawlings.pop(0)
+            if len(crawlings) == 0:
+                self.network.stop_crawling()
+            return nodes
+
+        self.network.crawling = crawling
+        self.network._is_perpetual = True
+        self.network.start_perpetual_crawling()
+
+    def test_unchanged(self):
+        self.crawl(list(self.nodes), list(reversed(self.nodes)))
+        self.assertEqual(self.network.nodes, self.nodes)
+        self.assertEqual((self.added, self.removed, self.changes), ([], [], []))
+
+    def test_node_added(self):
+        node = make_node(8004, 10)
+        self.crawl(self.nodes + [node])
+        self.assertEqual(self.network.nodes, self.nodes + [node])
+        self.assertEqual(self.added, [node])
+        self.assertEqual(self.removed, [])
+        self.assertEqual(self.changes, [True])
+        self.assertIs(self.network.node("PUBKEY8004"), node)
+
+    def test_node_removed(self):
+        self.crawl(self.nodes[1:])
+        self.assertEqual(self.network.nodes, self.nodes[1:])
+        self.assertEqual(self.removed, [self.nodes[0]])
+        self.assertEqual(self.added, [])
+        self.assertIsNone(self.network.node("PUBKEY8001"))
+
+    def test_node_replaced(self):
+        node = make_node(8011, 12, pubkey="PUBKEY8001")
+        self.crawl([node] + self.nodes[1:])
+        self.assertEqual(self.removed, [self.nodes[0]])
+        self.assertEqual(self.added, [node])
+        self.assertIs(self.network.node("PUBKEY8001"), node)
+        self.assertEqual(self.network.latest_block, 12)
+        self.assertEqual(self.network.synced_nodes, [node])
+
+    def test_offline_node_expired(self):
+        self.nodes[0].state = Node.OFFLINE
+        self.network._index(self.nodes[0])
+        self.crawl(list(self.nodes))
+        self.assertEqual(self.removed, [])
+        self.nodes[0].last_change = time.time() - 3601
+        self.crawl(list(self.nodes))
+        self.assertEqual(self.removed, [self.nodes[0]])
+        self.assertEqual(self.network.nodes, self.nodes[1:])
+
+
+class NetworkCrawlingTest(unittest.TestCase):
+    # The neighbours of each node, by port
+    graph = {9000: [9001, 9002],
+             9001: [9003, 9004],
+             9002: [9003, 9005],
+             9003: [9000, 9006],
+             9006: []}
+    offline = {9004}
+    corrupted = {9005}
+    # Node 9006 has the pubkey of node 9001
+    pubkeys = {9006: "PUBKEY9001"}
+
+    def setUp(self):
+        self.fetched = []
+        self.root = make_node(9000, 1)
+        self.without_bma = Node("meta_brouzouf", [], "", "PUBKEYX", 1,
+                                Node.ONLINE, time.time(), "", "")
+        self.network = Network("meta_brouzouf", [self.root, self.without_bma])
+        patcher = patch.object(Node, 'fetch_state', lambda node: self.fetch_state(node))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def fetch_state(self, node):
+        port = node.endpoint.port
+        self.fetched.append(port)
+        if port in self.offline:
+            return {'error': ConnectionError("Connection refused")}
+        neighbours = [[BMAEndpoint(None, "127.0.0.1", None, p)]
+                      for p in self.graph.get(port, [])]
+        return {'pubkey': self.pubkeys.get(port, "PUBKEY{0}".format(port)),
+                'currency': "other" if port in self.corrupted else "meta_brouzouf",
+                'block': 1, 'latency': 0.01, 'neighbours': neighbours,
+                'peers_leaves': {}, 'uid': "", 'software': "", 'version': "",
+                'full_refresh': time.time()}
+
+    def test_breadth_first(self):
+        nodes = self.network.crawling()
+        self.assertEqual(sorted(n.pubkey for n in nodes),
+                         ["PUBKEY9000", "PUBKEY9001", "PUBKEY9002", "PUBKEY9003", "PUBKEYX"])
+        self.assertIn(self.root, nodes)
+        self.assertIn(self.without_bma, nodes)
+        # Each endpoint is fetched once, the root first
+        self.assertEqual(self.fetched[0], 9000)
+        self.assertEqual(sorted(self.fetched), [9000, 9001, 9002, 9003, 9004, 9005, 9006])
+
+    def test_known_node_offline(self):
+        self.offline = {9000}
+        nodes = self.network.crawling()
+        self.assertEqual(nodes, [self.root, self.without_bma])
+        self.assertEqual(self.root.state, Node.OFFLINE)
+        self.assertEqual(self.fetched, [9000])
+
+    def test_known_node_corrupted(self):
+        self.corrupted = {9000}
+        nodes = self.network.crawling()
+        self.assertEqual(nodes, [self.without_bma])
+        self.assertEqual(self.root.state, Node.CORRUPTED)
+
+    def test_deadline(self):
+        self.network.crawling_deadline = 0
+        nodes = self.network.crawling()
+        self.assertEqual(nodes, [self.root, self.without_bma])
+        self.assertEqual(self.fetched, [])
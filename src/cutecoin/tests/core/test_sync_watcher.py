@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+from cutecoin.core.watching.sync import SyncWatcher
+from cutecoin.tools.exceptions import NoPeerAvailable
+
+
+class FakeSync():
+    def __init__(self, results):
+        self.results = list(results)
+        self.calls = 0
+        self.exiting = False
+
+    def sync(self, progressed=None):
+        self.calls += 1
+        result = self.results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def stop(self):
+        self.exiting = True
+
+
+class FakeCommunity():
+    currency = "meta_brouzouf"
+
+
+class SyncWatcherTest(unittest.TestCase):
+    def watcher(self, results):
+        watcher = SyncWatcher(FakeCommunity())
+        watcher._sync = FakeSync(results)
+        self.stopped = []
+        self.errors = []
+        watcher.watching_stopped.connect(lambda: self.stopped.append(True))
+        watcher.error.connect(self.errors.append)
+        return watcher
+
+    def test_sync_until_no_new_block(self):
+        watcher = self.watcher([100, 2, 0])
+        watcher.watch()
+        self.assertEqual(watcher._sync.calls, 3)
+        self.assertEqual(self.stopped, [True])
+
+    def test_sync_once_when_up_to_date(self):
+        watcher = self.watcher([0])
+        watcher.watch()
+        self.assertEqual(watcher._sync.calls, 1)
+        self.assertEqual(self.stopped, [True])
+
+    def test_stop(self):
+        watcher = self.watcher([100, 100])
+        watcher.stop()
+        watcher.watch()
+        self.assertEqual(watcher._sync.calls, 1)
+
+    def test_no_peer_available(self):
+        watcher = self.watcher([NoPeerAvailable("meta_brouzouf", 0)])
+        watcher.watch()
+        self.assertEqual(self.errors, [])
+        self.assertEqual(self.stopped, [True])
+
+    def test_error(self):
+        watcher = self.watcher([10, ValueError("status code != 200 => 500")])
+        watcher.watch()
+        self.assertEqual(len(self.errors), 1)
+        self.assertEqual(self.stopped, [True])
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+from ucoinpy.documents import binary
+from ucoinpy.documents.block import Block
+from ucoinpy.documents.transaction import Transaction, InputSource, OutputSource
+from ucoinpy.documents.peer import Peer
+
+PUBKEY_FROM = "HsLShAtzXTVxeUtQd7yi5Z5Zh4zNvbu8sTEZ53nfKcqY"
+PUBKEY_TO = "8Fi1VSTbjkXguwThF4v2ZxC5whK7pwG2vcGTkPUPjPGU"
+SIGNATURE = "42yQm4hGTJYWkPg39hQAUgP6S6EQ4vTfXdJuxKEHL1ih6YHiDL2hcwrFgBHjXLRgxRhj2VNVqqc6b4JayKqTE14r"
+HASH = "DA39A3EE5E6B4B0D3255BFEF95601890AFD80709"
+
+
+def signed_raw(ud_line):
+    return """Version: 1
+Type: Block
+Currency: meta_brouzouf
+Nonce: 45079
+Number: 15
+PoWMin: 4
+Time: 1418083330
+MedianTime: 1418080208
+{ud_line}Issuer: {pubkey_from}
+PreviousHash: {hash}
+PreviousIssuer: {pubkey_to}
+MembersCount: 4
+Identities:
+Joiners:
+Actives:
+Leavers:
+Excluded:
+Certifications:
+{pubkey_from}:{pubkey_to}:0:{signature}
+Transactions:
+TX:1:1:2:2:1
+{pubkey_from}
+0:D:12:{hash}:100
+1:T:15:{hash}:50
+{pubkey_to}:120
+{pubkey_from}:30
+a comment
+{signature}
+{signature}
+""".format(ud_line=ud_line, pubkey_from=PUBKEY_FROM, pubkey_to=PUBKEY_TO,
+           hash=HASH, signature=SIGNATURE)
+
+
+TRANSACTION_RAW = """Version: 1
+Type: Transaction
+Currency: meta_brouzouf
+Issuers:
+{pubkey_from}
+{pubkey_to}
+Inputs:
+0:D:12:{hash}:100
+1:T:15:{hash}:50
+Outputs:
+{pubkey_to}:120
+{pubkey_from}:30
+Comment: a comment
+{signature}
+{signature}
+""".format(pubkey_from=PUBKEY_FROM, pubkey_to=PUBKEY_TO,
+           hash=HASH, signature=SIGNATURE)
+
+PEER_RAW = """Version: 1
+Type: Peer
+Currency: meta_brouzouf
+PublicKey: {pubkey}
+Block: 8-1922C324ABC4AF7EF7656734A31F5197888DDD52
+Endpoints:
+BASIC_MERKLED_API ucoin.inso.ovh 80.118.154.251 8999
+BASIC_MERKLED_API 2001:0db8:0000:85a3:0000:0000:ac1f:8001 9001
+OTHER_API some properties
+{signature}
+""".format(pubkey=PUBKEY_FROM, signature=SIGNATURE)
+
+
+class BinaryBlockTest(unittest.TestCase):
+    def round_trip(self, raw):
+        block = Block.from_signed_raw(raw)
+        decoded = binary.loads(binary.dumps(block))
+        self.assertEqual(decoded.signed_raw(), raw)
+        self.assertEqual(decoded.ud, block.ud)
+
+    def test_block_with_ud(self):
+        self.round_trip(signed_raw("UniversalDividend: 100\n"))
+
+    def test_block_with_zero_ud(self):
+        self.round_trip(signed_raw("UniversalDividend: 0\n"))
+
+    def test_block_without_ud(self):
+        self.round_trip(signed_raw(""))
+
+
+class BinaryDocumentsTest(unittest.TestCase):
+    def test_transaction(self):
+        transaction = Transaction.from_signed_raw(TRANSACTION_RAW)
+        decoded = binary.loads(binary.dumps(transaction))
+        self.assertIsInstance(decoded, Transaction)
+        self.assertEqual(decoded.signed_raw(), TRANSACTION_RAW)
+
+    def test_input_source(self):
+        input_source = InputSource(1, "T", 15, HASH, 50)
+        decoded = binary.loads(binary.dumps(input_source))
+        self.assertEqual(decoded, input_source)
+        self.assertEqual(decoded.inline(), input_source.inline())
+
+    def test_input_source_without_index(self):
+        input_source = InputSource(None, "D", 12, HASH, 100)
+        decoded = binary.loads(binary.dumps(input_source))
+        self.assertIsNone(decoded.index)
+        self.assertEqual(decoded, input_source)
+
+    def test_output_source(self):
+        output_source = OutputSource(PUBKEY_TO, 120)
+        decoded = binary.loads(binary.dumps(output_source))
+        self.assertEqual(decoded, output_source)
+
+    def test_peer(self):
+        peer = Peer.from_signed_raw(PEER_RAW)
+        decoded = binary.loads(binary.dumps(peer))
+        self.assertIsInstance(decoded, Peer)
+        self.assertEqual(decoded.endpoints, peer.endpoints)
+        self.assertEqual(decoded.signed_raw(), PEER_RAW)
+
+
+class BinaryDecodeErrorTest(unittest.TestCase):
+    def test_truncated(self):
+        data = binary.dumps(Block.from_signed_raw(signed_raw("")))
+        for length in (0, 2, len(binary.MAGIC) + 2, len(data) // 2, len(data) - 1):
+            with self.assertRaises(binary.DecodeError):
+                binary.loads(data[:length])
+
+    def test_trailing_data(self):
+        data = binary.dumps(OutputSource(PUBKEY_TO, 120))
+        with self.assertRaises(binary.DecodeError):
+            binary.loads(data + b'\x00')
+
+    def test_unknown_string_reference(self):
+        data = bytearray(binary.dumps(OutputSource(PUBKEY_TO, 120)))
+        # The pubkey header becomes a reference to the first string,
+        # which was never written
+        data[len(binary.MAGIC) + 2] = 1
+        with self.assertRaises(binary.DecodeError):
+            binary.loads(bytes(data))
+
+    def test_not_encoded(self):
+        with self.assertRaises(binary.DecodeError):
+            binary.loads(TRANSACTION_RAW.encode('utf-8'))